@@ -22,11 +22,17 @@ Usage:
 import argparse
 import asyncio
 import json
+import mmap
 import os
 import sys
 import time
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlsplit
+
+try:
+    import orjson  # Optional: much faster parser for the (large) crawl cache
+except ImportError:
+    orjson = None
 
 # Add crawl4ai to path
 sys.path.insert(0, "/Users/madhur/Documents/GitHub/crawl4ai")
@@ -57,6 +63,7 @@ MAX_CONCURRENT_DOMAINS = 3  # Max domains crawled concurrently within a batch
 MAX_DEPTH = 2  # Crawl up to 2 levels deep
 MAX_PAGES_PER_DOMAIN = 10  # Max pages per business website
 PAGE_TIMEOUT = 25000  # 25s per page
+CACHE_SAVE_EVERY = 5  # Save the cache after every 5 crawled domains
 
 # URL patterns to prioritize for subpage discovery
 PRIORITY_PATTERNS = [
@@ -66,25 +73,54 @@ PRIORITY_PATTERNS = [
     "*gallery*", "*infrastructure*", "*specialit*", "*special*",
 ]
 
+# Resource types aborted before download — only the HTML/text is used
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet", "other"}
+
 
 def load_cache() -> dict:
     """Load previously crawled results for resume support."""
-    if CACHE_FILE.exists():
+    if not CACHE_FILE.exists():
+        return {}
+    if orjson is None:
         with open(CACHE_FILE, "r") as f:
             return json.load(f)
-    return {}
+    # Parse straight from the page cache instead of reading into a Python str first
+    with open(CACHE_FILE, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            return orjson.loads(view)
 
 
 def save_cache(cache: dict):
     """Save crawl cache incrementally."""
-    with open(CACHE_FILE, "w") as f:
+    # Write to a temp file and swap it in, so an interrupted save leaves the last cache intact
+    tmp = CACHE_FILE.with_suffix(CACHE_FILE.suffix + ".tmp")
+    with open(tmp, "w") as f:
         json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_FILE)
+
+
+async def _route_without_heavy_resources(route):
+    """Abort requests for resource types that never reach the markdown."""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def block_heavy_resources(page, context, **kwargs):
+    """crawl4ai hook: install the resource filter on each new page.
+
+    Routed per page, not on the context: a deep crawl reuses one context, and
+    a context route added per page would stack a duplicate handler each time.
+    """
+    await page.route("**/*", _route_without_heavy_resources)
+    return page
 
 
 def get_domain(url: str) -> str:
     """Extract domain from URL."""
     try:
-        return urlparse(url).netloc.lower()
+        return urlsplit(url).netloc.lower()
     except Exception:
         return ""
 
@@ -99,6 +135,7 @@ async def deep_crawl_one_domain(url: str, place_id: str, name: str) -> dict:
         headless=True,
         text_mode=True,
         viewport_width=1280,
+        extra_args=["--blink-settings=imagesEnabled=false"],
     )
 
     # Set up URL filters
@@ -125,22 +162,22 @@ async def deep_crawl_one_domain(url: str, place_id: str, name: str) -> dict:
             ),
             options={"ignore_links": True},
         ),
+        stream=True,  # Yield pages as they finish instead of buffering all of them
         verbose=False,
     )
 
     pages = []
     try:
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            results = await crawler.arun(url=url, config=crawl_config)
-
-            # results is a list of CrawlResult when deep crawl is used
-            if not isinstance(results, list):
-                results = [results]
-
-            for result in results:
+        crawler = AsyncWebCrawler(config=browser_config)
+        crawler.crawler_strategy.set_hook("on_page_context_created", block_heavy_resources)
+        async with crawler:
+            # With stream=True the deep crawl yields one CrawlResult at a time,
+            # so each page's HTML/links are released once its markdown is taken
+            async for result in await crawler.arun(url=url, config=crawl_config):
                 if result.success:
                     md = ""
                     if result.markdown:
+                        # Only touch raw_markdown when pruning left nothing
                         md = result.markdown.fit_markdown or result.markdown.raw_markdown or ""
 
                     pages.append({
@@ -186,32 +223,37 @@ async def deep_crawl_one_domain(url: str, place_id: str, name: str) -> dict:
 
 
 async def crawl_domain_batch(batch: list, cache: dict, total: int, completed: int) -> tuple:
-    """Crawl a batch of domains concurrently."""
+    """Crawl a batch of domains concurrently, caching each result as it finishes."""
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOMAINS)
     batch_results = {}
 
     async def crawl_with_semaphore(place):
-        nonlocal completed
-        place_id = place["google_place_id"]
-        url = place["website"]
-        name = place["name"]
-
         async with semaphore:
-            result = await deep_crawl_one_domain(url, place_id, name)
-            completed += 1
+            result = await deep_crawl_one_domain(place["website"], place["google_place_id"], place["name"])
+            return place, result
 
-            success_pages = result.get("successful_pages", 0)
-            total_pages = result.get("total_pages", 0)
-            total_chars = result.get("total_chars", 0)
-            status = "OK" if success_pages > 0 else "FAIL"
+    tasks = [crawl_with_semaphore(place) for place in batch]
+    for next_done in asyncio.as_completed(tasks):
+        try:
+            place, result = await next_done
+        except Exception as e:
+            print(f"  ERROR crawling domain: {str(e)[:200]}")
+            continue
+
+        completed += 1
+        place_id = place["google_place_id"]
 
-            print(f"  [{completed}/{total}] {status} {name[:40]:40s} → {success_pages}/{total_pages} pages, {total_chars:,} chars")
+        success_pages = result.get("successful_pages", 0)
+        total_pages = result.get("total_pages", 0)
+        total_chars = result.get("total_chars", 0)
+        status = "OK" if success_pages > 0 else "FAIL"
 
-            batch_results[place_id] = result
-            return result
+        print(f"  [{completed}/{total}] {status} {place['name'][:40]:40s} → {success_pages}/{total_pages} pages, {total_chars:,} chars")
 
-    tasks = [crawl_with_semaphore(place) for place in batch]
-    await asyncio.gather(*tasks, return_exceptions=True)
+        cache[place_id] = result
+        batch_results[place_id] = result
+        if completed % CACHE_SAVE_EVERY == 0:
+            save_cache(cache)
 
     return batch_results, completed
 
@@ -239,14 +281,14 @@ async def main():
     print(f"\n  Total filtered places: {len(filtered_places)}")
     print(f"  With websites: {len(with_websites)}")
 
-    # Deduplicate by domain — many places share the same website
-    seen_domains = {}
-    unique_by_domain = []
+    # Deduplicate by domain — many places share the same website.
+    # setdefault keeps the first place seen for each domain.
+    by_domain = {}
     for place in with_websites:
         domain = get_domain(place["website"])
-        if domain and domain not in seen_domains:
-            seen_domains[domain] = place["google_place_id"]
-            unique_by_domain.append(place)
+        if domain:
+            by_domain.setdefault(domain, place)
+    unique_by_domain = list(by_domain.values())
 
     print(f"  Unique domains: {len(unique_by_domain)}")
 
@@ -284,10 +326,8 @@ async def main():
 
             batch_results, completed = await crawl_domain_batch(batch, cache, total, completed)
 
-            # Update cache
-            for place_id, result in batch_results.items():
-                cache[place_id] = result
-                results[place_id] = result
+            # crawl_domain_batch has already added each result to the cache
+            results.update(batch_results)
 
             save_cache(cache)
             print(f"  Cache saved ({len(cache)} domains)")
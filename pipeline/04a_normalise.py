@@ -13,12 +13,28 @@ Usage:
     python pipeline/04a_normalise.py
 """
 
+import functools
 import json
 import re
 import time
 from collections import Counter
 from pathlib import Path
 
+try:
+    import orjson  # Optional: much faster serializer for the output file
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # Optional: stream the raw places instead of loading them all at once
+except ImportError:
+    ijson = None
+
+try:
+    import ahocorasick  # Optional (pyahocorasick): literal-word automaton for Stage 1a
+except ImportError:
+    ahocorasick = None
+
 # ─── Configuration ────────────────────────────────────────────────────────────
 DATA_DIR = Path(__file__).parent / "data"
 INPUT_FILE = DATA_DIR / "places_search_raw.json"
@@ -33,7 +49,7 @@ HARD_EXCLUDE_PATTERNS = [
 
     # Addiction / de-addiction / alcohol / drug
     r"(addict|de.?addict|deaddict|nasha|nashamukti|nasha\s*mukti)",
-    r"\b(substance\s*abuse|sober\b|sobriety\b|detox)\b",
+    r"\b(substance\s*abuse|sober|sobriety|detox)\b",
     r"\balcohol\b",
     r"\bdrug\b",
 
@@ -52,7 +68,7 @@ HARD_EXCLUDE_PATTERNS = [
     r"\bpet\s*(care|clinic|hospital)\b",
 
     # Gym / fitness
-    r"\b(gym\b|fitness|crossfit|zumba)\b",
+    r"\b(gym|fitness|crossfit|zumba)\b",
 
     # Spa / beauty
     r"\bspa\b",
@@ -72,7 +88,7 @@ HARD_EXCLUDE_PATTERNS = [
     r"\b(software|technologies|infotech|it\s*solution)\b",
 
     # Food / restaurant
-    r"\b(restaurant|dhaba|cafe\b|tiffin)\b",
+    r"\b(restaurant|dhaba|cafe|tiffin)\b",
 
     # Blood bank
     r"\bblood\s*bank\b",
@@ -231,7 +247,7 @@ SOFT_EXCLUDE_PATTERNS = [
     (r"\bashram\b", r"(vridh|vriddhashram|old.age|elder|senior|aged)"),
     (r"\bcharitable trust\b", POSITIVE_KEYWORDS),
     (r"\b(hotel|hostel|paying\s*guest)\b", r"care"),
-    (r"\b(ngo\b|society\b|samaj|samiti|sangathan)\b", POSITIVE_KEYWORDS),
+    (r"\b(ngo|society|samaj|samiti|sangathan)\b", POSITIVE_KEYWORDS),
     (r"\bluxury\b.*rehab", None),  # always exclude
     (r"\bspeech therapy\b", POSITIVE_KEYWORDS),
     (r"\boccupational therapy\b", POSITIVE_KEYWORDS),
@@ -245,16 +261,168 @@ SOFT_EXCLUDE_PATTERNS = [
     (r"\beducat", POSITIVE_KEYWORDS),  # education, educator
 ]
 
+
+# Hard patterns that are just words — \bword\b, \bprefix, \b(a|b)\b — with
+# optional \b guards. Everything else (\s*, .*, ?) stays a residual regex.
+LITERAL_PATTERN_RE = re.compile(r"^(\\b)?(?:\(([a-z ]+(?:\|[a-z ]+)*)\)|([a-z ]+))(\\b)?$")
+
+
+def assemble_words(words: list) -> str:
+    """Assemble (word, end_boundary) pairs into a prefix-trie alternation.
+
+    Shared prefixes are emitted once (Regexp::Assemble style), e.g.
+    academ / acupuncture\\b -> a(?:c(?:adem|upuncture\\b)), so re branches on
+    each character instead of retrying every word. A word without a trailing
+    \\b already matches every longer word below it, so that subtree is dropped.
+    """
+    trie = {}
+    for word, end_boundary in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if not end_boundary:
+            node[""] = "open"
+        elif node.get("") != "open":
+            node[""] = "bounded"
+
+    def emit(node: dict) -> str:
+        if node.get("") == "open":
+            return ""
+        branches = [re.escape(ch) + emit(node[ch]) for ch in sorted(k for k in node if k)]
+        if node.get("") == "bounded":
+            branches.append(r"\b")
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return emit(trie)
+
+
+def fuse_patterns(patterns: list) -> re.Pattern:
+    """Fuse patterns into one alternation regex.
+
+    The shared leading \\b is factored out so the engine only tries the
+    alternatives at word boundaries instead of at every character, and the
+    plain-word patterns behind it are assembled into a prefix trie.
+    """
+    words = []
+    bounded = []
+    unbounded = []
+    for pat in patterns:
+        m = LITERAL_PATTERN_RE.match(pat)
+        if m and m.group(1):
+            words += [(word, bool(m.group(4))) for word in (m.group(2) or m.group(3)).split("|")]
+        elif pat.startswith(r"\b"):
+            bounded.append(f"(?:{pat[2:]})")
+        else:
+            unbounded.append(f"(?:{pat})")
+    if words:
+        bounded.insert(0, assemble_words(words))
+    branches = [r"\b(?:" + "|".join(bounded) + ")"] if bounded else []
+    branches += unbounded
+    return re.compile("|".join(branches))
+
+
+# Compiled once at import; sources are kept as the stats/Counter keys
+HARD_EXCLUDE_COMPILED = [(pat, re.compile(pat)) for pat in HARD_EXCLUDE_PATTERNS]
+SOFT_EXCLUDE_COMPILED = [
+    (neg_pat, re.compile(neg_pat), re.compile(pos_pat) if pos_pat else None)
+    for neg_pat, pos_pat in SOFT_EXCLUDE_PATTERNS
+]
+
+# Literal substrings at least one of which every soft negative pattern needs in
+# order to match. Names containing none of them (most names) skip the soft
+# pattern loop entirely. Keep in sync when adding soft patterns.
+SOFT_PREFILTER_LITERALS = (
+    "physio", "foundation", "clinic", "ambulance", "yoga", "ashram",
+    "charitable trust", "hotel", "hostel", "paying", "ngo", "society", "samaj",
+    "samiti", "sangathan", "luxury", "speech therapy", "occupational therapy",
+    "tech", "club", "psycho", "mental", "training", "maid", "educat",
+)
+SOFT_PREFILTER = re.compile("|".join(map(re.escape, SOFT_PREFILTER_LITERALS)))
+
+# A single scan decides whether *any* hard pattern matches. Only names that hit
+# are walked pattern-by-pattern to report the first match in list order (the
+# union reports the leftmost match, which would shift the per-pattern stats).
+HARD_EXCLUDE_UNION = fuse_patterns(HARD_EXCLUDE_PATTERNS)
+
+
+def build_literal_automaton(patterns: list) -> tuple:
+    """Split patterns into an Aho–Corasick automaton of literal words and a
+    residual list of (index, pattern, compiled regex).
+
+    Automaton values are lists of (index, word_len, start_boundary, end_boundary)
+    since several patterns can share a literal.
+    """
+    literals = {}
+    residual = []
+    for idx, pat in enumerate(patterns):
+        m = LITERAL_PATTERN_RE.match(pat)
+        if not m:
+            residual.append((idx, pat, re.compile(pat)))
+            continue
+        start_b, end_b = bool(m.group(1)), bool(m.group(4))
+        for word in (m.group(2) or m.group(3)).split("|"):
+            literals.setdefault(word, []).append((idx, len(word), start_b, end_b))
+
+    automaton = ahocorasick.Automaton()
+    for word, entries in literals.items():
+        automaton.add_word(word, entries)
+    automaton.make_automaton()
+    return automaton, residual
+
+
+if ahocorasick is not None:
+    HARD_LITERAL_AUTOMATON, HARD_RESIDUAL_COMPILED = build_literal_automaton(HARD_EXCLUDE_PATTERNS)
+
+
+def is_word_char(ch: str) -> bool:
+    """Same notion of a word character as re's Unicode \\b."""
+    return ch.isalnum() or ch == "_"
+
+
+def first_hard_match(name_lower: str) -> str | None:
+    """Return the first hard pattern (in list order) that matches, or None."""
+    if ahocorasick is None:
+        for pat, regex in HARD_EXCLUDE_COMPILED:
+            if regex.search(name_lower):
+                return pat
+        return None
+
+    # Lowest-index literal pattern whose \b guards hold
+    best = len(HARD_EXCLUDE_PATTERNS)
+    last = len(name_lower) - 1
+    for end, entries in HARD_LITERAL_AUTOMATON.iter(name_lower):
+        for idx, word_len, start_b, end_b in entries:
+            if idx >= best:
+                continue
+            start = end - word_len + 1
+            if start_b and start > 0 and is_word_char(name_lower[start - 1]):
+                continue
+            if end_b and end < last and is_word_char(name_lower[end + 1]):
+                continue
+            best = idx
+
+    # Only residual patterns listed before that literal can take precedence
+    for idx, pat, regex in HARD_RESIDUAL_COMPILED:
+        if idx >= best:
+            break
+        if regex.search(name_lower):
+            return pat
+    return HARD_EXCLUDE_PATTERNS[best] if best < len(HARD_EXCLUDE_PATTERNS) else None
+
+
 # ─── Stage 1b: Primary type whitelist ─────────────────────────────────────────
 
-KEEP_PRIMARY_TYPES = {"health", "medical_clinic", "service", "medical_center", ""}
+KEEP_PRIMARY_TYPES = frozenset({"health", "medical_clinic", "service", "medical_center", ""})
 
 # Primary types that are definitively healthcare — skip sub-type exclusion for these
-HEALTHCARE_PRIMARY_TYPES = {"health", "medical_clinic", "medical_center"}
+HEALTHCARE_PRIMARY_TYPES = frozenset({"health", "medical_clinic", "medical_center"})
+
+# Whitelisted but not definitively healthcare — these still go through Stage 1c
+NON_HEALTHCARE_KEEP_TYPES = KEEP_PRIMARY_TYPES - HEALTHCARE_PRIMARY_TYPES
 
 # ─── Stage 1c: Sub-type exclusion ─────────────────────────────────────────────
 
-EXCLUDE_SUBTYPES = {
+EXCLUDE_SUBTYPES = frozenset({
     # Childcare / education
     "child_care_agency", "preschool", "school", "university",
     "educational_institution",
@@ -313,38 +481,66 @@ EXCLUDE_SUBTYPES = {
     "travel_agency", "laundry", "event_venue", "garden", "market",
     "storage", "bar", "sports_bar", "sports_club", "courthouse", "police",
     "accounting", "electrician",
-}
+})
 
 
 # ─── Filter functions ─────────────────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=None)
 def check_stage1a(name_lower: str) -> str | None:
-    """Check name against Stage 1a patterns. Returns matched pattern or None."""
-    for pat in HARD_EXCLUDE_PATTERNS:
-        if re.search(pat, name_lower):
-            return pat
-    for neg_pat, pos_pat in SOFT_EXCLUDE_PATTERNS:
-        if re.search(neg_pat, name_lower):
-            if pos_pat is None:
+    """Check name against Stage 1a patterns. Returns matched pattern or None.
+
+    Memoized: chain outlets repeat the same name, and the result only depends
+    on the module-level patterns.
+    """
+    if HARD_EXCLUDE_UNION.search(name_lower):
+        matched = first_hard_match(name_lower)
+        if matched:
+            return matched
+    if not SOFT_PREFILTER.search(name_lower):
+        return None
+    for neg_pat, neg_regex, pos_regex in SOFT_EXCLUDE_COMPILED:
+        if neg_regex.search(name_lower):
+            if pos_regex is None:
                 return neg_pat
-            if not re.search(pos_pat, name_lower):
+            if not pos_regex.search(name_lower):
                 return neg_pat
     return None
 
 
-def check_stage1b(primary_type: str) -> bool:
-    """Returns True if excluded by primary type."""
-    return primary_type not in KEEP_PRIMARY_TYPES
-
-
 def check_stage1c(types: list) -> str | None:
     """Returns first bad sub-type found, or None."""
+    # isdisjoint does the hash lookups in C; most records have no bad sub-type
+    if EXCLUDE_SUBTYPES.isdisjoint(types):
+        return None
     for t in types:
         if t in EXCLUDE_SUBTYPES:
             return t
     return None
 
 
+def write_json(filepath: Path, data) -> None:
+    """Write data as indented UTF-8 JSON (orjson when available)."""
+    if orjson is not None:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def iter_raw_places():
+    """Yield (place_id, place) pairs from INPUT_FILE.
+
+    With ijson the file is parsed incrementally, so only surviving places stay
+    in memory; otherwise the whole dict is loaded first.
+    """
+    with open(INPUT_FILE, "rb") as f:
+        if ijson is not None:
+            yield from ijson.kvitems(f, "", use_float=True)
+        else:
+            yield from json.load(f).items()
+
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -354,24 +550,22 @@ def main():
     print("  STAGE 1 NORMALIZER — Three-Pass Junk Filter")
     print("=" * 70)
 
-    # Load raw places
-    with open(INPUT_FILE, "r") as f:
-        raw_places = json.load(f)
-
-    total = len(raw_places)
-    print(f"\n  Input: {total} raw places from {INPUT_FILE.name}")
-
-    # Counters
-    stage1a_reasons = Counter()
-    stage1b_reasons = Counter()
-    stage1c_reasons = Counter()
+    # Exclusion reasons are collected as plain lists and counted once at the
+    # end — Counter(iterable) counts in C instead of one += per record
+    stage1a_hits = []
+    stage1b_hits = []
+    stage1c_hits = []
     status_excluded = 0
 
     surviving = {}
-
-    for pid, place in raw_places.items():
-        name = place.get("name", "")
-        name_lower = name.lower()
+    total = 0
+
+    # Filter while the raw places are being parsed
+    for pid, place in iter_raw_places():
+        total += 1
+        # Lowercased once per record; every pattern is written in lowercase,
+        # so no re.IGNORECASE is needed anywhere in Stage 1a
+        name_lower = place.get("name", "").lower()
         primary_type = place.get("primary_type", "") or ""
         types = place.get("types", [])
         business_status = place.get("business_status", "OPERATIONAL") or "OPERATIONAL"
@@ -384,27 +578,32 @@ def main():
         # Stage 1a: Name patterns
         matched_pattern = check_stage1a(name_lower)
         if matched_pattern:
-            stage1a_reasons[matched_pattern] += 1
-            continue
-
-        # Stage 1b: Primary type whitelist
-        if check_stage1b(primary_type):
-            stage1b_reasons[primary_type] += 1
+            stage1a_hits.append(matched_pattern)
             continue
 
-        # Stage 1c: Sub-type exclusion (skip if primary type is definitively healthcare)
+        # Stage 1b + 1c: definitively-healthcare primary types pass both checks
+        # with one lookup; other types must be whitelisted (1b) and then pass
+        # sub-type exclusion (1c)
         if primary_type not in HEALTHCARE_PRIMARY_TYPES:
+            if primary_type not in NON_HEALTHCARE_KEEP_TYPES:
+                stage1b_hits.append(primary_type)
+                continue
             bad_subtype = check_stage1c(types)
             if bad_subtype:
-                stage1c_reasons[bad_subtype] += 1
+                stage1c_hits.append(bad_subtype)
                 continue
 
         surviving[pid] = place
 
+    print(f"\n  Input: {total} raw places from {INPUT_FILE.name}")
+
+    stage1a_reasons = Counter(stage1a_hits)
+    stage1b_reasons = Counter(stage1b_hits)
+    stage1c_reasons = Counter(stage1c_hits)
+
     # Save output
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(surviving, f, indent=2, ensure_ascii=False)
+    write_json(OUTPUT_FILE, surviving)
 
     # ─── Print stats ───
     s1a_total = sum(stage1a_reasons.values()) + status_excluded
@@ -444,9 +643,7 @@ def main():
         print(f"    {st:<55} {count:>5}")
 
     # Surviving primary type breakdown
-    pt_counts = Counter()
-    for v in surviving.values():
-        pt_counts[v.get("primary_type", "") or "NONE"] += 1
+    pt_counts = Counter(v.get("primary_type", "") or "NONE" for v in surviving.values())
 
     print(f"\n  --- Surviving by primary_type ---")
     for pt, count in pt_counts.most_common():
@@ -15,19 +15,43 @@ Classifies entries into:
 Uses ONLY: business name + website crawl content (no Google types).
 """
 
+import hashlib
 import json
 import re
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from collections import Counter
 
+try:
+    import orjson  # Optional: much faster parsing of the crawl dump and output writes
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick  # Optional (pyahocorasick): literal-keyword automaton for content counts
+except ImportError:
+    ahocorasick = None
+
 DATA_DIR = Path(__file__).parent / "data"
 FILTERED_FILE = DATA_DIR / "stage1_filtered.json"
 CRAWL_FILE = DATA_DIR / "deep_crawl_results.json"
 OUTPUT_RULES = DATA_DIR / "stage2_rules_delhi.json"
 OUTPUT_LLM = DATA_DIR / "stage2_llm_delhi.json"
+BATCH_INPUT_FILE = DATA_DIR / "stage2_llm_batch_input.jsonl"
+LLM_CACHE_FILE = DATA_DIR / "stage2_classify_test_cache.json"  # not 04b_normalise's pid-keyed cache
+CACHE_SAVE_EVERY = 50
+BATCH_POLL_SECONDS = 30
+
+# gpt-4o-mini allows ~500 RPM; calls are latency-bound, so run several at once
+LLM_WORKERS = 8
+LLM_RPM = 500
+RATE_LIMIT_SECONDS = 60 / LLM_RPM
+LLM_TIMEOUT_SECONDS = 30  # a stuck request should not hold a worker for the SDK's 10 min default
+LLM_MAX_RETRIES = 3       # SDK retries 429/5xx with exponential backoff
 
 CATEGORIES = [
     "Nursing Homes",
@@ -84,163 +108,321 @@ POST_HOSPITAL_QUALIFIERS = [
     r"\bhead\s*injury\b",
 ]
 
+# Category pattern lists — name patterns are strong signals on their own,
+# content patterns are counted (2+ hits = confident match)
+ELDER_NAME_PATTERNS = [
+    r"\bold\s*age\s*home\b",
+    r"\bvridh|vruddh|vrudh|vriddh|vriddhashram|vrudhashram",
+    r"\bassisted\s*living\b",
+    r"\bsenior\s*(care|living|citizen|home)\b",
+    r"\belder\s*(care|home|ly\s*care)\b",
+    r"\bgeriatric\b",
+    r"\bretirement\s*(home|community|living)\b",
+    r"\baged\s*care\b",
+    r"\bmemory\s*care\b",
+]
+ELDER_CONTENT_PATTERNS = [
+    r"\bold\s*age\s*home\b",
+    r"\bassisted\s*living\b",
+    r"\bsenior\s*(care|living|citizen)\b",
+    r"\belder\s*(care|ly\s*care)\b",
+    r"\bgeriatric\s*care\b",
+    r"\bretirement\s*(home|community|living)\b",
+    r"\bdementia\s*care\b",
+    r"\balzheimer\b.*\bcare\b",
+    r"\bmemory\s*care\b",
+    r"\baged\s*care\b",
+    r"\bcompanion\s*care\b",
+]
+ELDER_WEAK_NAME_PATTERNS = [r"\bsenior\b", r"\belder\b", r"\bold\b"]
+
+NURSING_NAME_PATTERNS = [
+    r"\bnursing\s*home\b",
+    r"\bnursing\s*facility\b",
+    r"\bskilled\s*nursing\b",
+]
+NURSING_CONTENT_PATTERNS = [
+    r"\bnursing\s*home\b",
+    r"\bnursing\s*facility\b",
+    r"\bskilled\s*nursing\b",
+    r"\b24.hour\s*nursing\b",
+    r"\bround.the.clock\s*nursing\b",
+    r"\blong.term\s*care\s*facility\b",
+    r"\binpatient\s*nursing\b",
+]
+
+HOME_NAME_PATTERNS = [
+    r"\bhome\s*(health\s*care|healthcare|nursing|nurse|care\s*service)\b",
+    r"\bcare\s*at\s*home\b",
+    r"\bnursing\s*at\s*home\b",
+    r"\bhomecare\b",
+    r"\bdomiciliary\b",
+    r"\bpatient\s*care\s*(service|at\s*home)\b",
+    r"\bnursing\s*(bureau|agency|service|staff)\b",
+    r"\bcare\s*taker|caretaker\b",
+    r"\battendant\b.*\b(service|bureau|provider)\b",
+    r"\bhome\b.*\bnursing\s*service\b",
+]
+HOME_CONTENT_PATTERNS = [
+    r"\bhome\s*(health\s*care|healthcare|nursing)\s*(service|provider)\b",
+    r"\bnursing\s*at\s*home\b",
+    r"\bcare\s*at\s*home\b",
+    r"\bpatient\s*care\s*at\s*home\b",
+    r"\bhome\s*visit\b",
+    r"\bdomiciliary\s*care\b",
+    r"\bhomecare\s*service\b",
+    r"\bnurse\s*(on\s*call|at\s*home|provider)\b",
+    r"\bcaregiv",
+    r"\bin.home\s*(care|nursing|service)\b",
+    r"\bbedside\s*care\b",
+]
+HOME_WEAK_NAME_PATTERNS = [r"\bhome\b", r"\bpatient\b", r"\bnurs"]
 
-def has_any_pattern(text, patterns):
-    """Check if text matches any of the patterns."""
+# Must have post-hospital qualifiers — pure physio/rehab goes to Other
+POST_HOSPITAL_NAME_PATTERNS = [
+    r"\btransition\s*care\b",
+    r"\bpost.hospital\b",
+    r"\bpost.operative\b",
+    r"\bpost.surgical\b",
+    r"\bpalliative\b",
+    r"\bhospice\b",
+    r"\bend.of.life\b",
+    r"\bcritical\s*(care|illness)\b",
+    r"\bdementia\s*care\b",
+    r"\balzheimer\b",
+    r"\bparkinson\b",
+    r"\bcerebral\s*palsy\b",
+    r"\bneuro\s*rehab",
+    r"\bcardiac\s*rehab",
+    r"\bstroke\s*(care|rehab|recovery)\b",
+    r"\bbed.?ridden\b",
+]
+
+# Fallback for "nursing" in name without a category match
+NURSING_HOME_CONTENT_PATTERNS = [r"\bhome\b.*\b(care|nursing)\b", r"\bat\s*home\b"]
+NURSING_FACILITY_CONTENT_PATTERNS = [r"\bfacility\b", r"\binpatient\b", r"\bbed\b"]
+
+
+def compile_patterns(patterns):
+    """Compile a pattern list once at import time."""
+    return [re.compile(p) for p in patterns]
+
+
+def split_alternatives(pat):
+    """Split a pattern on its top-level | (alternatives outside any group)."""
+    alts, depth, start, i = [], 0, 0, 0
+    while i < len(pat):
+        ch = pat[i]
+        if ch == "\\":
+            i += 2  # skip the escaped character
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            alts.append(pat[start:i])
+            start = i + 1
+        i += 1
+    alts.append(pat[start:])
+    return alts
+
+
+def fuse_patterns(patterns):
+    """Fuse a pattern list into one alternation — a single scan per text.
+
+    Alternatives starting with \\b share one leading \\b, so most positions
+    are rejected by a single boundary test instead of one per pattern. Only
+    used for "does anything match" checks, so the order inside is free.
+    """
+    bounded, other = [], []
     for pat in patterns:
-        if re.search(pat, text):
-            return True
-    return False
+        for alt in split_alternatives(pat):
+            if alt.startswith(r"\b"):
+                bounded.append(f"(?:{alt[2:]})")
+            else:
+                other.append(f"(?:{alt})")
+    if bounded:
+        other.insert(0, r"\b(?:" + "|".join(bounded) + ")")
+    return re.compile("|".join(other))
+
 
+# Patterns that are a bare keyword with optional \b guards, e.g. \bdementia\b
+LITERAL_PATTERN_RE = re.compile(r"^(\\b)?([a-z]+)(\\b)?$")
 
-def classify_rule_based(name, content):
+
+def build_pattern_counter(patterns):
+    """Build (fused, automaton, residual_fused, residual) for counting distinct
+    pattern hits. Bare keywords go into an Aho–Corasick automaton whose values
+    are lists of (index, word_len, start_boundary, end_boundary); everything
+    else stays a regex. Without pyahocorasick every pattern is residual.
+    """
+    literals = {}
+    residual = []
+    for idx, pat in enumerate(patterns):
+        m = LITERAL_PATTERN_RE.match(pat) if ahocorasick is not None else None
+        if not m:
+            residual.append(pat)
+            continue
+        word = m.group(2)
+        literals.setdefault(word, []).append((idx, len(word), bool(m.group(1)), bool(m.group(3))))
+
+    automaton = None
+    if literals:
+        automaton = ahocorasick.Automaton()
+        for word, entries in literals.items():
+            automaton.add_word(word, entries)
+        automaton.make_automaton()
+    residual_fused = fuse_patterns(residual) if residual else None
+    return fuse_patterns(patterns), automaton, residual_fused, compile_patterns(residual)
+
+
+# Fused alternations answer "does any pattern match?" in one pass; counted
+# groups also get a counter, since the rules count distinct patterns
+PURE_PHYSIO_ANY = fuse_patterns(PURE_PHYSIO_SIGNALS)
+POST_HOSPITAL_ANY = fuse_patterns(POST_HOSPITAL_QUALIFIERS)
+POST_HOSPITAL_COUNTER = build_pattern_counter(POST_HOSPITAL_QUALIFIERS)
+ELDER_NAME_ANY = fuse_patterns(ELDER_NAME_PATTERNS)
+ELDER_CONTENT_COUNTER = build_pattern_counter(ELDER_CONTENT_PATTERNS)
+ELDER_WEAK_NAME_ANY = fuse_patterns(ELDER_WEAK_NAME_PATTERNS)
+NURSING_NAME_ANY = fuse_patterns(NURSING_NAME_PATTERNS)
+NURSING_CONTENT_COUNTER = build_pattern_counter(NURSING_CONTENT_PATTERNS)
+HOME_NAME_ANY = fuse_patterns(HOME_NAME_PATTERNS)
+HOME_CONTENT_COUNTER = build_pattern_counter(HOME_CONTENT_PATTERNS)
+HOME_WEAK_NAME_ANY = fuse_patterns(HOME_WEAK_NAME_PATTERNS)
+POST_HOSPITAL_NAME_ANY = fuse_patterns(POST_HOSPITAL_NAME_PATTERNS)
+NURSING_HOME_CONTENT_ANY = fuse_patterns(NURSING_HOME_CONTENT_PATTERNS)
+NURSING_FACILITY_CONTENT_ANY = fuse_patterns(NURSING_FACILITY_CONTENT_PATTERNS)
+NURSING_WORD_RE = re.compile(r"\bnursing\b")
+REHAB_WORD_RE = re.compile(r"\brehab")
+CARE_OR_REHAB_RE = re.compile(r"\b(care|rehab)")
+
+
+# Optional \b, then the literal run a match has to start with
+LEADING_LITERAL_RE = re.compile(r"^(?:\\b)?([a-z0-9]+)(.?)")
+
+
+def build_literal_prefilter(patterns):
+    """Regex of the literals at least one of which any of the patterns needs,
+    or None if some pattern does not start with a literal.
+    """
+    literals = set()
+    for pat in patterns:
+        for alt in split_alternatives(pat):
+            m = LEADING_LITERAL_RE.match(alt)
+            if not m:
+                return None
+            literal = m.group(1)
+            if m.group(2) in ("?", "*", "{"):
+                literal = literal[:-1]  # last char is optional
+            if not literal:
+                return None
+            literals.add(literal)
+    return re.compile("|".join(map(re.escape, sorted(literals))))
+
+
+# Without crawl content only the name checks below can fire; a name containing
+# none of their leading literals (most names) is "Other" without any of them
+NAME_SIGNAL_PREFILTER = build_literal_prefilter(
+    ELDER_NAME_PATTERNS + NURSING_NAME_PATTERNS + HOME_NAME_PATTERNS
+    + POST_HOSPITAL_NAME_PATTERNS + [r"\brehab", r"\bnursing\b"]
+)
+
+
+def is_word_char(ch):
+    """Same notion of a word character as re's Unicode \\b."""
+    return ch.isalnum() or ch == "_"
+
+
+def count_patterns(text, counter):
+    """Count how many distinct patterns match text (fused scan first)."""
+    fused, automaton, residual_fused, residual = counter
+    if not fused.search(text):
+        return 0
+
+    hits = 0
+    if automaton is not None:
+        matched = set()
+        last = len(text) - 1
+        for end, entries in automaton.iter(text):
+            for idx, word_len, start_b, end_b in entries:
+                start = end - word_len + 1
+                if start_b and start > 0 and is_word_char(text[start - 1]):
+                    continue
+                if end_b and end < last and is_word_char(text[end + 1]):
+                    continue
+                matched.add(idx)
+        hits = len(matched)
+
+    if residual_fused is not None and residual_fused.search(text):
+        hits += sum(1 for pat in residual if pat.search(text))
+    return hits
+
+
+def classify_rule_based(name, content_lower):
     """
     Classify using rules. Returns (category, confidence, reason).
+    content_lower is the lowercased, truncated crawl text (see build_content_cache).
     """
     name_lower = name.lower()
-    content_lower = (content or "").lower()[:15000]
+    if not content_lower and NAME_SIGNAL_PREFILTER and not NAME_SIGNAL_PREFILTER.search(name_lower):
+        return "Other", "none", "no category match"
     combined = name_lower + " " + content_lower
 
     # ── 1. Elder Care (check first — strong signals) ──────────────────────
-    elder_name_patterns = [
-        r"\bold\s*age\s*home\b",
-        r"\bvridh|vruddh|vrudh|vriddh|vriddhashram|vrudhashram",
-        r"\bassisted\s*living\b",
-        r"\bsenior\s*(care|living|citizen|home)\b",
-        r"\belder\s*(care|home|ly\s*care)\b",
-        r"\bgeriatric\b",
-        r"\bretirement\s*(home|community|living)\b",
-        r"\baged\s*care\b",
-        r"\bmemory\s*care\b",
-    ]
-    elder_content_patterns = [
-        r"\bold\s*age\s*home\b",
-        r"\bassisted\s*living\b",
-        r"\bsenior\s*(care|living|citizen)\b",
-        r"\belder\s*(care|ly\s*care)\b",
-        r"\bgeriatric\s*care\b",
-        r"\bretirement\s*(home|community|living)\b",
-        r"\bdementia\s*care\b",
-        r"\balzheimer\b.*\bcare\b",
-        r"\bmemory\s*care\b",
-        r"\baged\s*care\b",
-        r"\bcompanion\s*care\b",
-    ]
-
-    if has_any_pattern(name_lower, elder_name_patterns):
+    if ELDER_NAME_ANY.search(name_lower):
         return "Elder Care", "high", "strong name match"
 
-    elder_content_hits = sum(1 for p in elder_content_patterns if re.search(p, content_lower))
+    elder_content_hits = count_patterns(content_lower, ELDER_CONTENT_COUNTER)
     if elder_content_hits >= 2:
         return "Elder Care", "high", f"content matches x{elder_content_hits}"
-    if elder_content_hits == 1 and has_any_pattern(name_lower, [r"\bsenior\b", r"\belder\b", r"\bold\b"]):
+    if elder_content_hits == 1 and ELDER_WEAK_NAME_ANY.search(name_lower):
         return "Elder Care", "medium", "weak name + content match"
 
     # ── 2. Nursing Homes ──────────────────────────────────────────────────
-    nursing_name_patterns = [
-        r"\bnursing\s*home\b",
-        r"\bnursing\s*facility\b",
-        r"\bskilled\s*nursing\b",
-    ]
-    nursing_content_patterns = [
-        r"\bnursing\s*home\b",
-        r"\bnursing\s*facility\b",
-        r"\bskilled\s*nursing\b",
-        r"\b24.hour\s*nursing\b",
-        r"\bround.the.clock\s*nursing\b",
-        r"\blong.term\s*care\s*facility\b",
-        r"\binpatient\s*nursing\b",
-    ]
-
-    if has_any_pattern(name_lower, nursing_name_patterns):
+    if NURSING_NAME_ANY.search(name_lower):
         return "Nursing Homes", "high", "strong name match"
 
-    nursing_content_hits = sum(1 for p in nursing_content_patterns if re.search(p, content_lower))
+    nursing_content_hits = count_patterns(content_lower, NURSING_CONTENT_COUNTER)
     if nursing_content_hits >= 2:
         return "Nursing Homes", "high", f"content matches x{nursing_content_hits}"
-    if nursing_content_hits == 1 and re.search(r"\bnursing\b", name_lower):
+    if nursing_content_hits == 1 and NURSING_WORD_RE.search(name_lower):
         return "Nursing Homes", "medium", "nursing in name + content"
 
     # ── 3. Home Health Care ───────────────────────────────────────────────
-    home_name_patterns = [
-        r"\bhome\s*(health\s*care|healthcare|nursing|nurse|care\s*service)\b",
-        r"\bcare\s*at\s*home\b",
-        r"\bnursing\s*at\s*home\b",
-        r"\bhomecare\b",
-        r"\bdomiciliary\b",
-        r"\bpatient\s*care\s*(service|at\s*home)\b",
-        r"\bnursing\s*(bureau|agency|service|staff)\b",
-        r"\bcare\s*taker|caretaker\b",
-        r"\battendant\b.*\b(service|bureau|provider)\b",
-        r"\bhome\b.*\bnursing\s*service\b",
-    ]
-    home_content_patterns = [
-        r"\bhome\s*(health\s*care|healthcare|nursing)\s*(service|provider)\b",
-        r"\bnursing\s*at\s*home\b",
-        r"\bcare\s*at\s*home\b",
-        r"\bpatient\s*care\s*at\s*home\b",
-        r"\bhome\s*visit\b",
-        r"\bdomiciliary\s*care\b",
-        r"\bhomecare\s*service\b",
-        r"\bnurse\s*(on\s*call|at\s*home|provider)\b",
-        r"\bcaregiv",
-        r"\bin.home\s*(care|nursing|service)\b",
-        r"\bbedside\s*care\b",
-    ]
-
-    if has_any_pattern(name_lower, home_name_patterns):
+    if HOME_NAME_ANY.search(name_lower):
         return "Home Health Care", "high", "strong name match"
 
-    home_content_hits = sum(1 for p in home_content_patterns if re.search(p, content_lower))
+    home_content_hits = count_patterns(content_lower, HOME_CONTENT_COUNTER)
     if home_content_hits >= 2:
         return "Home Health Care", "high", f"content matches x{home_content_hits}"
-    if home_content_hits == 1 and has_any_pattern(name_lower, [r"\bhome\b", r"\bpatient\b", r"\bnurs"]):
+    if home_content_hits == 1 and HOME_WEAK_NAME_ANY.search(name_lower):
         return "Home Health Care", "medium", "weak name + content match"
 
     # ── 4. Post-Hospital Care ─────────────────────────────────────────────
-    # Must have post-hospital qualifiers — pure physio/rehab goes to Other
-    post_hospital_name_patterns = [
-        r"\btransition\s*care\b",
-        r"\bpost.hospital\b",
-        r"\bpost.operative\b",
-        r"\bpost.surgical\b",
-        r"\bpalliative\b",
-        r"\bhospice\b",
-        r"\bend.of.life\b",
-        r"\bcritical\s*(care|illness)\b",
-        r"\bdementia\s*care\b",
-        r"\balzheimer\b",
-        r"\bparkinson\b",
-        r"\bcerebral\s*palsy\b",
-        r"\bneuro\s*rehab",
-        r"\bcardiac\s*rehab",
-        r"\bstroke\s*(care|rehab|recovery)\b",
-        r"\bbed.?ridden\b",
-    ]
-
-    if has_any_pattern(name_lower, post_hospital_name_patterns):
+    if POST_HOSPITAL_NAME_ANY.search(name_lower):
         return "Post-Hospital Care", "high", "strong name match"
 
     # "rehab" in name — only qualifies if also has post-hospital qualifiers
-    if re.search(r"\brehab", name_lower):
-        if has_any_pattern(combined, POST_HOSPITAL_QUALIFIERS):
+    if REHAB_WORD_RE.search(name_lower):
+        if POST_HOSPITAL_ANY.search(combined):
             return "Post-Hospital Care", "medium", "rehab + post-hospital qualifier"
         # rehab but only physio signals → Other
-        if has_any_pattern(combined, PURE_PHYSIO_SIGNALS):
+        if PURE_PHYSIO_ANY.search(combined):
             return "Other", "medium", "rehab but pure physio"
 
     # Check content for post-hospital signals
-    post_content_hits = sum(1 for p in POST_HOSPITAL_QUALIFIERS if re.search(p, content_lower))
+    post_content_hits = count_patterns(content_lower, POST_HOSPITAL_COUNTER)
     if post_content_hits >= 2:
         return "Post-Hospital Care", "medium", f"content post-hospital signals x{post_content_hits}"
-    if post_content_hits == 1 and re.search(r"\b(care|rehab)", name_lower):
+    if post_content_hits == 1 and CARE_OR_REHAB_RE.search(name_lower):
         return "Post-Hospital Care", "low", "weak post-hospital signal"
 
     # ── 5. Fallback: check for nursing without "home" ─────────────────────
-    if re.search(r"\bnursing\b", name_lower):
-        if content_lower and has_any_pattern(content_lower, [r"\bhome\b.*\b(care|nursing)\b", r"\bat\s*home\b"]):
+    if NURSING_WORD_RE.search(name_lower):
+        if content_lower and NURSING_HOME_CONTENT_ANY.search(content_lower):
             return "Home Health Care", "low", "nursing + home content signal"
-        if content_lower and has_any_pattern(content_lower, [r"\bfacility\b", r"\binpatient\b", r"\bbed\b"]):
+        if content_lower and NURSING_FACILITY_CONTENT_ANY.search(content_lower):
             return "Nursing Homes", "low", "nursing + facility content signal"
         # Just "nursing" in name, no content — likely nursing bureau / home care
         return "Home Health Care", "low", "nursing in name, default"
@@ -253,19 +435,33 @@ def get_crawl_content(crawl_data, place_id):
     """Get combined markdown content from crawl results."""
     if place_id not in crawl_data:
         return ""
-    entry = crawl_data[place_id]
-    pages = entry.get("pages", [])
-    combined = []
-    for page in pages:
-        text = page.get("markdown", "")
-        if text and len(text) > 50:
-            combined.append(text)
-    return "\n\n".join(combined)
+    pages = crawl_data[place_id].get("pages", [])
+    return "\n\n".join(text for page in pages if (text := page.get("markdown")) and len(text) > 50)
+
+
+# Entries without crawl results
+NO_CONTENT = ("", "", False)
+
+
+def build_content_cache(crawl_data):
+    """Join each crawled place's pages once, shared by both classifiers.
+
+    Returns {place_id: (content_lower, content_head, has_content)} — the
+    lowercased first 15000 chars for the rules, the original first 4000 chars
+    for the LLM prompt, and whether there is more than 200 chars of content.
+    """
+    cache = {}
+    for pid in crawl_data:
+        content = get_crawl_content(crawl_data, pid)
+        cache[pid] = (content.lower()[:15000], content[:4000], len(content) > 200)
+    return cache
 
 
 # ─── LLM-Based Classifier ─────────────────────────────────────────────────────
 
-CLASSIFY_PROMPT = """You are a healthcare facility classifier for an Indian healthcare directory called Karo Care.
+# Static system message — identical on every request, so the provider can
+# reuse it as a cached prompt prefix; only the short user message varies
+CLASSIFY_RULES = """You are a healthcare facility classifier for an Indian healthcare directory called Karo Care.
 
 Classify this business into EXACTLY ONE of these 5 categories:
 
@@ -285,8 +481,9 @@ IMPORTANT RULES:
 - A business providing both nursing home AND elder care → pick the DOMINANT one
 - If unclear from the data, classify as "Other"
 - Use ONLY the information provided (name + website content). Do NOT use any prior knowledge about the business.
+"""
 
-Business name: "{name}"
+CLASSIFY_PROMPT = """Business name: "{name}"
 
 {content_section}
 
@@ -294,9 +491,39 @@ Respond with ONLY a JSON object:
 {{"category": "<one of the 5 categories>", "confidence": "<high|medium|low>", "reason": "<brief 1-line reason>"}}
 """
 
+# Several businesses per request so the category rules are sent once per
+# MARSHAL_ROWS entries instead of once per entry
+MARSHAL_ROWS = 10
+MARSHAL_CONTENT_CHARS = 1500
 
-def classify_llm(name, content, client):
-    """Classify using GPT-4o-mini. Returns (category, confidence, reason)."""
+MARSHAL_PROMPT = """Classify each of these {count} businesses independently:
+
+{rows}
+
+Respond with ONLY a JSON object with one result per business, using its number as "id":
+{{"results": [{{"id": <number>, "category": "<one of the 5 categories>", "confidence": "<high|medium|low>", "reason": "<brief 1-line reason>"}}]}}
+"""
+
+
+class RateLimiter:
+    """Thread-safe rate limiter — spaces request starts across all workers."""
+
+    def __init__(self, min_interval: float = RATE_LIMIT_SECONDS):
+        self.min_interval = min_interval
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_request_time)
+            self.next_request_time = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def build_llm_request(name, content):
+    """Chat-completion request body for one business (shared by online + batch)."""
     if content and len(content) > 200:
         # Truncate to ~4000 chars
         truncated = content[:4000]
@@ -308,38 +535,185 @@ def classify_llm(name, content, client):
         name=name,
         content_section=content_section,
     )
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": CLASSIFY_RULES},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0,
+        "max_tokens": 150,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def parse_llm_response(text):
+    """Parse the model's JSON reply into (category, confidence, reason)."""
+    result = json.loads(text)
+    return (
+        result.get("category", "Other"),
+        result.get("confidence", "low"),
+        result.get("reason", ""),
+    )
+
+
+def classify_llm(name, content, client):
+    """Classify using GPT-4o-mini. Returns (category, confidence, reason)."""
+    try:
+        response = client.chat.completions.create(**build_llm_request(name, content))
+        return parse_llm_response(response.choices[0].message.content)
+    except Exception as e:
+        return "Other", "none", f"LLM error: {str(e)[:50]}"
+
+
+def llm_cache_key(name, content):
+    """Cache key for one classification: the name plus the prompt's content slice."""
+    return hashlib.sha1(f"{name}\0{content[:4000]}".encode()).hexdigest()
+
 
+def load_cache():
+    """Load cached LLM classifications {key: [category, confidence, reason]}."""
+    if LLM_CACHE_FILE.exists():
+        with open(LLM_CACHE_FILE) as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache):
+    """Save the LLM classification cache."""
+    with open(LLM_CACHE_FILE, "w") as f:
+        json.dump(cache, f, ensure_ascii=False)
+
+
+def classify_llm_marshaled(rows, client):
+    """Classify several (name, content) rows in one request. Returns one
+    (category, confidence, reason) per row, in order.
+    """
+    blocks = []
+    for i, (name, content) in enumerate(rows, 1):
+        if content and len(content) > 200:
+            snippet = content[:MARSHAL_CONTENT_CHARS]
+            blocks.append(f'{i}. Business name: "{name}"\nWebsite content (truncated):\n"""\n{snippet}\n"""')
+        else:
+            blocks.append(f'{i}. Business name: "{name}"\nNo website content available.')
+
+    prompt = MARSHAL_PROMPT.format(count=len(rows), rows="\n\n".join(blocks))
     try:
         response = client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": CLASSIFY_RULES},
+                {"role": "user", "content": prompt},
+            ],
             temperature=0,
-            max_tokens=150,
-        )
-        text = response.choices[0].message.content.strip()
-        # Parse JSON
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-        result = json.loads(text)
-        return (
-            result.get("category", "Other"),
-            result.get("confidence", "low"),
-            result.get("reason", ""),
+            max_tokens=80 * len(rows),
+            response_format={"type": "json_object"},
         )
+        by_id = {r.get("id"): r for r in json.loads(response.choices[0].message.content).get("results", [])}
     except Exception as e:
-        return "Other", "none", f"LLM error: {str(e)[:50]}"
+        return [("Other", "none", f"LLM error: {str(e)[:50]}")] * len(rows)
 
+    labels = []
+    for i in range(1, len(rows) + 1):
+        result = by_id.get(i)
+        if result is None:
+            labels.append(("Other", "none", "LLM error: row missing from response"))
+        else:
+            labels.append((
+                result.get("category", "Other"),
+                result.get("confidence", "low"),
+                result.get("reason", ""),
+            ))
+    return labels
+
+
+def classify_llm_batch(delhi, content_cache, client):
+    """Classify every Delhi entry in one OpenAI Batch API job (half the price,
+    no RPM limit, results within the 24h window). Returns {pid: (category,
+    confidence, reason)}.
+    """
+    with open(BATCH_INPUT_FILE, "w") as f:
+        for pid, place in delhi.items():
+            content = content_cache.get(pid, NO_CONTENT)[1]
+            f.write(json.dumps({
+                "custom_id": pid,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": build_llm_request(place.get("name", ""), content),
+            }, ensure_ascii=False) + "\n")
+
+    with open(BATCH_INPUT_FILE, "rb") as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    print(f"  Submitted batch {batch.id} ({len(delhi)} requests)")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        print(f"    {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+
+    classified = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            row = json.loads(line)
+            try:
+                body = row["response"]["body"]
+                classified[row["custom_id"]] = parse_llm_response(body["choices"][0]["message"]["content"])
+            except Exception as e:
+                classified[row["custom_id"]] = ("Other", "none", f"LLM error: {str(e)[:50]}")
+
+    # Requests missing from the output (batch failed/expired, per-request errors)
+    for pid in delhi:
+        classified.setdefault(pid, ("Other", "none", f"LLM error: no batch result ({batch.status})"))
+    return classified
+
+
+def render_report(results, cat_counts, conf_counts, total):
+    """Category/confidence breakdown plus sample entries, as one string."""
+    lines = ["", "  --- Classification Results ---"]
+    for cat in CATEGORIES:
+        count = cat_counts.get(cat, 0)
+        pct = count / total * 100
+        lines.append(f"    {cat:25s}: {count:5d}  ({pct:.1f}%)")
 
-def run_rules_delhi(all_data, crawl_data):
+    lines += ["", "  --- Confidence Levels ---"]
+    for conf in ["high", "medium", "low", "none"]:
+        count = conf_counts.get(conf, 0)
+        pct = count / total * 100
+        lines.append(f"    {conf:10s}: {count:5d}  ({pct:.1f}%)")
+
+    # First 10 entries per category, collected in one pass over the results
+    samples = {cat: [] for cat in CATEGORIES}
+    for r in results.values():
+        entries = samples[r["category"]]
+        if len(entries) < 10:
+            entries.append((r["name"], r["confidence"]))
+
+    for cat in CATEGORIES:
+        lines += ["", f"  --- {cat} ({cat_counts.get(cat, 0)} total, showing 10) ---"]
+        for name, conf in samples[cat]:
+            lines.append(f"    [{conf:6s}] {name[:70]}")
+    return "\n".join(lines) + "\n"
+
+
+def filter_delhi(all_data):
+    """Entries found in Delhi (older records only carry _search_city)."""
+    return {pid: p for pid, p in all_data.items()
+            if (city := p.get("_found_in_city")) == "Delhi"
+            or (city is None and p.get("_search_city") == "Delhi")}
+
+
+def run_rules_delhi(delhi, content_cache):
     """Run rule-based classifier on Delhi."""
     print("=" * 70)
     print("  RULE-BASED CLASSIFIER — Delhi")
     print("=" * 70)
 
-    delhi = {pid: p for pid, p in all_data.items()
-             if p.get("_found_in_city", p.get("_search_city", "")) == "Delhi"}
     print(f"\n  Delhi entries: {len(delhi)}")
 
     results = {}
@@ -348,50 +722,36 @@ def run_rules_delhi(all_data, crawl_data):
 
     for pid, place in delhi.items():
         name = place.get("name", "")
-        content = get_crawl_content(crawl_data, pid)
-        category, confidence, reason = classify_rule_based(name, content)
+        content_lower, _, has_content = content_cache.get(pid, NO_CONTENT)
+        category, confidence, reason = classify_rule_based(name, content_lower)
 
         results[pid] = {
             "name": name,
             "category": category,
             "confidence": confidence,
             "reason": reason,
-            "has_content": len(content) > 200,
+            "has_content": has_content,
         }
         cat_counts[category] += 1
         conf_counts[confidence] += 1
 
-    print(f"\n  --- Classification Results ---")
-    for cat in CATEGORIES:
-        count = cat_counts.get(cat, 0)
-        pct = count / len(delhi) * 100
-        print(f"    {cat:25s}: {count:5d}  ({pct:.1f}%)")
+    sys.stdout.write(render_report(results, cat_counts, conf_counts, len(delhi)))
 
-    print(f"\n  --- Confidence Levels ---")
-    for conf in ["high", "medium", "low", "none"]:
-        count = conf_counts.get(conf, 0)
-        pct = count / len(delhi) * 100
-        print(f"    {conf:10s}: {count:5d}  ({pct:.1f}%)")
-
-    for cat in CATEGORIES:
-        entries = [(r["name"], r["confidence"], r["reason"])
-                   for r in results.values() if r["category"] == cat]
-        print(f"\n  --- {cat} ({len(entries)} total, showing 10) ---")
-        for name, conf, reason in entries[:10]:
-            print(f"    [{conf:6s}] {name[:70]}")
-
-    with open(OUTPUT_RULES, "w") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    write_json(OUTPUT_RULES, results)
     print(f"\n  Saved: {OUTPUT_RULES}")
     print("=" * 70)
 
     return results
 
 
-def run_llm_delhi(all_data, crawl_data):
-    """Run LLM-based classifier on Delhi."""
+def run_llm_delhi(delhi, content_cache, method="online"):
+    """Run LLM-based classifier on Delhi.
+
+    method: "online" (one request per entry), "marshal" (MARSHAL_ROWS entries
+    per request) or "batch" (one Batch API job).
+    """
     print("\n" + "=" * 70)
-    print("  LLM-BASED CLASSIFIER — Delhi (GPT-4o-mini)")
+    print(f"  LLM-BASED CLASSIFIER — Delhi (GPT-4o-mini, {method})")
     print("=" * 70)
 
     # Check for API key
@@ -402,13 +762,12 @@ def run_llm_delhi(all_data, crawl_data):
 
     try:
         from openai import OpenAI
-        client = OpenAI(api_key=api_key)
+        # One client for all workers — its HTTP pool keeps connections alive across requests
+        client = OpenAI(api_key=api_key, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES)
     except ImportError:
         print("  ERROR: openai package not installed. pip install openai")
         return None
 
-    delhi = {pid: p for pid, p in all_data.items()
-             if p.get("_found_in_city", p.get("_search_city", "")) == "Delhi"}
     print(f"\n  Delhi entries: {len(delhi)}")
 
     results = {}
@@ -416,52 +775,89 @@ def run_llm_delhi(all_data, crawl_data):
     conf_counts = Counter()
     errors = 0
 
-    total = len(delhi)
-    for i, (pid, place) in enumerate(delhi.items()):
-        name = place.get("name", "")
-        content = get_crawl_content(crawl_data, pid)
-        category, confidence, reason = classify_llm(name, content, client)
-
-        if category not in CATEGORIES:
-            category = "Other"
-
-        results[pid] = {
-            "name": name,
-            "category": category,
-            "confidence": confidence,
-            "reason": reason,
-            "has_content": len(content) > 200,
-        }
-        cat_counts[category] += 1
-        conf_counts[confidence] += 1
-
-        if (i + 1) % 50 == 0:
-            print(f"    Processed {i+1}/{total}...")
-
-        # Rate limit — ~500 RPM for gpt-4o-mini
-        time.sleep(0.15)
+    # Online and batch send the same request per entry, so they share a cache
+    # and a rerun only pays for new or changed entries. Marshaled rows see
+    # less content and are not cached.
+    cache = {}
+    keys = {}
+    if method != "marshal":
+        cache = load_cache()
+        keys = {pid: llm_cache_key(place.get("name", ""), content_cache.get(pid, NO_CONTENT)[1])
+                for pid, place in delhi.items()}
+        print(f"  Cached: {sum(1 for key in keys.values() if key in cache)}")
+    new_entries = 0
 
-    print(f"\n  --- Classification Results ---")
-    for cat in CATEGORIES:
-        count = cat_counts.get(cat, 0)
-        pct = count / len(delhi) * 100
-        print(f"    {cat:25s}: {count:5d}  ({pct:.1f}%)")
-
-    print(f"\n  --- Confidence Levels ---")
-    for conf in ["high", "medium", "low", "none"]:
-        count = conf_counts.get(conf, 0)
-        pct = count / len(delhi) * 100
-        print(f"    {conf:10s}: {count:5d}  ({pct:.1f}%)")
+    total = len(delhi)
+    rate_limiter = RateLimiter()
 
-    for cat in CATEGORIES:
-        entries = [(r["name"], r["confidence"], r["reason"])
-                   for r in results.values() if r["category"] == cat]
-        print(f"\n  --- {cat} ({len(entries)} total, showing 10) ---")
-        for name, conf, reason in entries[:10]:
-            print(f"    [{conf:6s}] {name[:70]}")
-
-    with open(OUTPUT_LLM, "w") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    def classify_one(item):
+        pid, place = item
+        name = place.get("name", "")
+        content = content_cache.get(pid, NO_CONTENT)[1]
+        cached = cache.get(keys[pid])
+        if cached:
+            return pid, name, tuple(cached)
+        rate_limiter.wait()
+        return pid, name, classify_llm(name, content, client)
+
+    def classify_chunk(chunk):
+        rows = [(pid, place.get("name", ""), content_cache.get(pid, NO_CONTENT)[1]) for pid, place in chunk]
+        rate_limiter.wait()
+        labels = classify_llm_marshaled([(name, content) for _, name, content in rows], client)
+        return [(pid, name, label) for (pid, name, _), label in zip(rows, labels)]
+
+    pool = None  # only the online and marshal paths make calls from here
+    try:
+        if method == "batch":
+            batch_results = {pid: tuple(cache[key]) for pid, key in keys.items() if key in cache}
+            pending = {pid: place for pid, place in delhi.items() if pid not in batch_results}
+            if pending:
+                batch_results.update(classify_llm_batch(pending, content_cache, client))
+            classified = ((pid, place.get("name", ""), batch_results[pid]) for pid, place in delhi.items())
+        elif method == "marshal":
+            pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+            items = list(delhi.items())
+            chunks = [items[i:i + MARSHAL_ROWS] for i in range(0, len(items), MARSHAL_ROWS)]
+            classified = (row for rows in pool.map(classify_chunk, chunks) for row in rows)
+        else:
+            pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+            # map() keeps Delhi order in the results while up to LLM_WORKERS calls are in flight
+            classified = pool.map(classify_one, delhi.items())
+
+        for i, (pid, name, (category, confidence, reason)) in enumerate(classified):
+            key = keys.get(pid)
+            if key and key not in cache and not reason.startswith("LLM error"):
+                cache[key] = [category, confidence, reason]
+                new_entries += 1
+                if new_entries % CACHE_SAVE_EVERY == 0:
+                    save_cache(cache)
+
+            if category not in CATEGORIES:
+                category = "Other"
+
+            results[pid] = {
+                "name": name,
+                "category": category,
+                "confidence": confidence,
+                "reason": reason,
+                "has_content": content_cache.get(pid, NO_CONTENT)[2],
+            }
+            cat_counts[category] += 1
+            conf_counts[confidence] += 1
+
+            if (i + 1) % 50 == 0:
+                print(f"    Processed {i+1}/{total}...")
+    finally:
+        # On Ctrl-C, drop the queued calls instead of running (and paying for) them all
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if new_entries:
+        save_cache(cache)
+
+    sys.stdout.write(render_report(results, cat_counts, conf_counts, len(delhi)))
+
+    write_json(OUTPUT_LLM, results)
     print(f"\n  Saved: {OUTPUT_LLM}")
     print("=" * 70)
 
@@ -501,13 +897,10 @@ def compare_results(rules_results, llm_results):
     print(f"  Disagreement: {disagree}/{total} ({disagree/total*100:.1f}%)")
 
     # Show disagreement patterns
-    from collections import defaultdict
-    patterns = defaultdict(int)
-    for d in disagreements:
-        patterns[(d["rules"], d["llm"])] += 1
+    patterns = Counter((d["rules"], d["llm"]) for d in disagreements)
 
     print(f"\n  --- Disagreement patterns ---")
-    for (r, l), count in sorted(patterns.items(), key=lambda x: -x[1]):
+    for (r, l), count in patterns.most_common():
         print(f"    Rules={r:25s} → LLM={l:25s}  x{count}")
 
     print(f"\n  --- Sample disagreements (first 20) ---")
@@ -520,22 +913,44 @@ def compare_results(rules_results, llm_results):
     print("=" * 70)
 
 
+def load_json(filepath):
+    """Read a JSON file, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(filepath.read_bytes())
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def write_json(filepath, data):
+    """Write data as indented UTF-8 JSON."""
+    if orjson is not None:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
 def main():
     mode = sys.argv[1] if len(sys.argv) > 1 else "both"
 
-    with open(FILTERED_FILE) as f:
-        all_data = json.load(f)
-    with open(CRAWL_FILE) as f:
-        crawl_data = json.load(f)
+    all_data = load_json(FILTERED_FILE)
+    crawl_data = load_json(CRAWL_FILE)
+    delhi = filter_delhi(all_data)
+    content_cache = build_content_cache(crawl_data)
 
     rules_results = None
     llm_results = None
 
     if mode in ("rules", "both"):
-        rules_results = run_rules_delhi(all_data, crawl_data)
+        rules_results = run_rules_delhi(delhi, content_cache)
 
     if mode in ("llm", "both"):
-        llm_results = run_llm_delhi(all_data, crawl_data)
+        llm_results = run_llm_delhi(delhi, content_cache)
+    elif mode in ("batch", "marshal"):
+        # Same comparison as "both", with the LLM pass submitted as one Batch API
+        # job or with several entries per request
+        rules_results = run_rules_delhi(delhi, content_cache)
+        llm_results = run_llm_delhi(delhi, content_cache, method=mode)
 
     if rules_results and llm_results:
         compare_results(rules_results, llm_results)
@@ -27,18 +27,33 @@ Writes:
 Usage:
     export OPENAI_API_KEY="your-key-here"
     python pipeline/04b_normalise.py
+    python pipeline/04b_normalise.py --marshal   # several entries per LLM request
 """
 
+import argparse
+import hashlib
 import json
 import re
 import os
 import sys
+import threading
 import time
 import math
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
 from collections import Counter
 
+try:
+    import orjson  # Optional: much faster cache checkpoints and output writes
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # Optional: stream the crawl dump instead of loading it all at once
+except ImportError:
+    ijson = None
+
 # ─── Configuration ────────────────────────────────────────────────────────────
 DATA_DIR = Path(__file__).parent / "data"
 FILTERED_FILE = DATA_DIR / "stage1_filtered.json"
@@ -49,6 +64,22 @@ CACHE_FILE = DATA_DIR / "stage2_llm_cache.json"
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_MODEL = "gpt-4o-mini"
 
+# Calls are latency-bound (~1-2s each), so keep several in flight while the
+# shared rate limiter holds the pool as a whole under the RPM quota
+LLM_WORKERS = 16
+LLM_RPM = 500
+RATE_LIMIT_SECONDS = 60 / LLM_RPM
+
+# --marshal: up to MARSHAL_ROWS entries per request, each with a shorter
+# content excerpt so the prompt stays within budget
+MARSHAL_ROWS = 10
+MARSHAL_CONTENT_CHARS = 1200
+
+# Longest crawl content any pass reads — the review scans this much, the
+# LLM prompt only its first PROMPT_CONTENT_CHARS
+CONTENT_MAX_CHARS = 15000
+PROMPT_CONTENT_CHARS = 4000
+
 CATEGORIES = [
     "Nursing Homes",
     "Elder Care",
@@ -59,7 +90,7 @@ CATEGORIES = [
 
 # ─── LLM Prompt ───────────────────────────────────────────────────────────────
 
-CLASSIFY_PROMPT = """You are a healthcare facility classifier for an Indian healthcare directory called Karo Care.
+CLASSIFY_RULES = """You are a healthcare facility classifier for an Indian healthcare directory called Karo Care.
 
 Classify this business into EXACTLY ONE of these 5 categories:
 
@@ -80,7 +111,9 @@ IMPORTANT RULES:
 - If unclear from the data, classify as "Other"
 - Use ONLY the information provided (name + website content). Do NOT use any prior knowledge about the business.
 
-Business name: "{name}"
+"""
+
+CLASSIFY_PROMPT = CLASSIFY_RULES + """Business name: "{name}"
 
 {content_section}
 
@@ -88,128 +121,189 @@ Respond with ONLY a JSON object:
 {{"category": "<one of the 5 categories>", "confidence": "<high|medium|low>", "reason": "<brief 1-line reason>"}}
 """
 
+MARSHAL_PROMPT = CLASSIFY_RULES + """Classify each of these {count} businesses independently:
+
+{rows}
+
+Respond with ONLY a JSON object with one result per business, using its number as "id":
+{{"results": [{{"id": <number>, "category": "<one of the 5 categories>", "confidence": "<high|medium|low>", "reason": "<brief 1-line reason>"}}]}}
+"""
+
 
 # ─── Pass 2: Post-LLM Correction Rules ────────────────────────────────────────
 # These patterns catch known LLM misclassifications and re-assign them.
+# Compiled once at import; correction reasons quote each pattern's source text.
+
+def compile_patterns(patterns):
+    return tuple(re.compile(p) for p in patterns)
+
+
+# LLM sometimes classifies addiction rehab as Post-Hospital Care
+ADDICTION_RES = compile_patterns([
+    r"\b(addict|de.?addict|deaddict)\b",
+    r"\b(nasha|nashamukti|nasha\s*mukti)\b",
+    r"\b(substance\s*abuse|sober|sobriety|detox)\b",
+    r"\balcohol\b.*\b(rehab|recovery|treatment)\b",
+    r"\bdrug\b.*\b(rehab|recovery|treatment)\b",
+    r"\baddiction\s*(treatment|recovery|rehab)\b",
+])
+
+# LLM sometimes classifies psychiatric facilities as Post-Hospital Care
+PSYCH_RES = compile_patterns([
+    r"\bpsychiatr",
+    r"\bmental\s*(health|illness|disorder)\b",
+    r"\bpsychological\b",
+    r"\bmental\s*hospital\b",
+])
+
+# Genuine post-hospital signals that keep a psychiatric or physio-named
+# entry in the category
+POST_HOSPITAL_RES = compile_patterns([
+    r"\bstroke\b", r"\bparalysis\b", r"\bdementia\b", r"\balzheimer\b",
+    r"\bparkinson\b", r"\bcerebral\s*palsy\b", r"\bpost.operative\b",
+    r"\bpost.surgical\b", r"\bcritical\s*(care|illness)\b",
+    r"\bpalliative\b", r"\bhospice\b", r"\bbed.?ridden\b",
+    r"\bventilat", r"\btransition\s*care\b", r"\bicu\b",
+])
+
+CHILD_RES = compile_patterns([
+    r"\bchildren\b.*\b(disabilit|handicap|special\s*needs)\b",
+    r"\b(handicapped|disabled)\s*children\b",
+    r"\bchild\b.*\brehab",
+    r"\b(autism|adhd|cerebral\s*palsy)\b.*\bchild",
+    r"\bchild\b.*\b(cerebral\s*palsy|autism|adhd)\b",
+])
+
+LAB_RES = compile_patterns([
+    r"\bpath\s*lab\b",
+    r"\blab\s*test\b",
+    r"\bblood\s*test\b",
+    r"\bdiagnostic\b",
+    r"\bx.?ray\b",
+    r"\bultrasound\b",
+    r"\bmri\b",
+    r"\bct\s*scan\b",
+])
+
+PHYSIO_NAME_RES = compile_patterns([
+    r"\bphysio",
+    r"\bchiro",
+])
+
+# Extra signals that keep a physio-named entry in the category, on top of
+# POST_HOSPITAL_RES (the psychiatric check does not use these)
+PHYSIO_NEURO_RES = compile_patterns([
+    r"\bspinal\s*cord\b",
+    r"\btraumatic\s*brain\b",
+])
+
+STAFFING_RES = compile_patterns([
+    r"\bstaffing\b",
+    r"\bmanpower\b",
+    r"\brecruitment\b",
+    r"\bplacement\b.*\b(agency|service|bureau)\b",
+])
+
+EQUIP_RES = compile_patterns([
+    r"\b(wheelchair|oxygen\s*cylinder|medical\s*equipment)\b",
+    r"\b(surgical\s*item|medical\s*supply|medical\s*store)\b",
+    r"\b(equipment\s*rental|on\s*rent)\b",
+])
+
+
+def fuse_patterns(compiled):
+    """Fuse compiled patterns into one alternation — a single scan per text.
+
+    Every review pattern starts with \\b, so the alternatives share one
+    leading boundary test. Used only to decide whether any pattern matches;
+    the per-pattern tuples still name the pattern quoted in the reason.
+    """
+    assert all(p.pattern.startswith(r"\b") for p in compiled)
+    return re.compile(r"\b(?:" + "|".join(f"(?:{p.pattern[2:]})" for p in compiled) + ")")
+
+
+ADDICTION_ANY = fuse_patterns(ADDICTION_RES)
+PSYCH_ANY = fuse_patterns(PSYCH_RES)
+POST_HOSPITAL_ANY = fuse_patterns(POST_HOSPITAL_RES)
+CHILD_ANY = fuse_patterns(CHILD_RES)
+LAB_ANY = fuse_patterns(LAB_RES)
+PHYSIO_NAME_ANY = fuse_patterns(PHYSIO_NAME_RES)
+PHYSIO_NEURO_ANY = fuse_patterns(PHYSIO_NEURO_RES)
+STAFFING_ANY = fuse_patterns(STAFFING_RES)
+EQUIP_ANY = fuse_patterns(EQUIP_RES)
+
+
+# A name matching any of these always ends Pass 2 on Other, whatever the LLM
+# said: the lab and equipment checks read only the name, and a staffing hit
+# in the name is also a hit in name + content. Pass 1 skips the API call for
+# such entries and leaves the correction to Pass 2.
+NAME_RULE_RES = LAB_RES + STAFFING_RES + EQUIP_RES
+NAME_RULE_ANY = fuse_patterns(NAME_RULE_RES)
+
+
+def first_match(compiled, text):
+    """Return the first pattern (in list order) that matches text."""
+    return next(p for p in compiled if p.search(text))
+
 
 def post_llm_review(name, content, llm_category, llm_reason):
     """
     Review LLM classification and correct known mistakes.
     Returns (final_category, corrected, correction_reason).
     """
+    # Every rule moves an entry *to* Other, so Other needs no review at all
+    if llm_category == "Other":
+        return llm_category, False, ""
+
     name_lower = name.lower()
-    content_lower = (content or "").lower()[:15000]
+    content_lower = (content or "").lower()[:CONTENT_MAX_CHARS]
     combined = name_lower + " " + content_lower
+    post_hospital = llm_category == "Post-Hospital Care"
+    has_post_hospital = None  # POST_HOSPITAL_ANY hit, scanned at most once
 
-    # ── Addiction/de-addiction rehab → Other ───────────────────────────────
-    # LLM sometimes classifies addiction rehab as Post-Hospital Care
-    if llm_category == "Post-Hospital Care":
-        addiction_patterns = [
-            r"\b(addict|de.?addict|deaddict)\b",
-            r"\b(nasha|nashamukti|nasha\s*mukti)\b",
-            r"\b(substance\s*abuse|sober|sobriety|detox)\b",
-            r"\balcohol\b.*\b(rehab|recovery|treatment)\b",
-            r"\bdrug\b.*\b(rehab|recovery|treatment)\b",
-            r"\baddiction\s*(treatment|recovery|rehab)\b",
-        ]
-        for pat in addiction_patterns:
-            if re.search(pat, combined):
-                return "Other", True, f"addiction rehab reclassified: {pat}"
-
-    # ── Psychiatric rehab → Other ─────────────────────────────────────────
-    # LLM sometimes classifies psychiatric facilities as Post-Hospital Care
-    if llm_category == "Post-Hospital Care":
-        psych_patterns = [
-            r"\bpsychiatr",
-            r"\bmental\s*(health|illness|disorder)\b",
-            r"\bpsychological\b",
-            r"\bmental\s*hospital\b",
-        ]
+    if post_hospital:
+        # ── Addiction/de-addiction rehab → Other ───────────────────────────
+        if ADDICTION_ANY.search(combined):
+            pat = first_match(ADDICTION_RES, combined)
+            return "Other", True, f"addiction rehab reclassified: {pat.pattern}"
+
+        # ── Psychiatric rehab → Other ─────────────────────────────────────
         # Only reclassify if there are NO genuine post-hospital signals
-        post_hospital_signals = [
-            r"\bstroke\b", r"\bparalysis\b", r"\bdementia\b", r"\balzheimer\b",
-            r"\bparkinson\b", r"\bcerebral\s*palsy\b", r"\bpost.operative\b",
-            r"\bpost.surgical\b", r"\bcritical\s*(care|illness)\b",
-            r"\bpalliative\b", r"\bhospice\b", r"\bbed.?ridden\b",
-            r"\bventilat", r"\btransition\s*care\b", r"\bicu\b",
-        ]
-        has_psych = any(re.search(p, combined) for p in psych_patterns)
-        has_post_hospital = any(re.search(p, combined) for p in post_hospital_signals)
-        if has_psych and not has_post_hospital:
-            return "Other", True, "psychiatric rehab without post-hospital signals"
-
-    # ── Children's disability rehab → Other ───────────────────────────────
-    if llm_category == "Post-Hospital Care":
-        child_patterns = [
-            r"\bchildren\b.*\b(disabilit|handicap|special\s*needs)\b",
-            r"\b(handicapped|disabled)\s*children\b",
-            r"\bchild\b.*\brehab",
-            r"\b(autism|adhd|cerebral\s*palsy)\b.*\bchild",
-            r"\bchild\b.*\b(cerebral\s*palsy|autism|adhd)\b",
-        ]
-        for pat in child_patterns:
-            if re.search(pat, combined):
-                return "Other", True, f"children's disability rehab: {pat}"
+        if PSYCH_ANY.search(combined):
+            has_post_hospital = POST_HOSPITAL_ANY.search(combined) is not None
+            if not has_post_hospital:
+                return "Other", True, "psychiatric rehab without post-hospital signals"
+
+        # ── Children's disability rehab → Other ───────────────────────────
+        if CHILD_ANY.search(combined):
+            pat = first_match(CHILD_RES, combined)
+            return "Other", True, f"children's disability rehab: {pat.pattern}"
 
     # ── Lab/diagnostic that slipped through → Other ───────────────────────
-    lab_patterns = [
-        r"\bpath\s*lab\b",
-        r"\blab\s*test\b",
-        r"\bblood\s*test\b",
-        r"\bdiagnostic\b",
-        r"\bx.?ray\b",
-        r"\bultrasound\b",
-        r"\bmri\b",
-        r"\bct\s*scan\b",
-    ]
-    for pat in lab_patterns:
-        if re.search(pat, combined):
-            # Only reclassify if the primary business seems to be a lab
-            if llm_category != "Other":
-                # Check if lab is the primary business (appears in name)
-                if re.search(pat, name_lower):
-                    return "Other", True, f"diagnostic/lab reclassified: {pat}"
+    # Only reclassify if the primary business seems to be a lab, i.e. the
+    # pattern appears in the name. combined starts with the name, so a name
+    # hit is always a combined hit and only the name needs scanning.
+    if LAB_ANY.search(name_lower):
+        pat = first_match(LAB_RES, name_lower)
+        return "Other", True, f"diagnostic/lab reclassified: {pat.pattern}"
 
     # ── Pure physio that LLM missed → Other ───────────────────────────────
-    if llm_category == "Post-Hospital Care":
-        physio_only_name = [
-            r"\bphysio",
-            r"\bchiro",
-        ]
-        has_physio_name = any(re.search(p, name_lower) for p in physio_only_name)
-        has_post_hospital = any(re.search(p, combined) for p in [
-            r"\bstroke\b", r"\bparalysis\b", r"\bdementia\b", r"\balzheimer\b",
-            r"\bparkinson\b", r"\bcerebral\s*palsy\b", r"\bpost.operative\b",
-            r"\bpost.surgical\b", r"\bcritical\s*(care|illness)\b",
-            r"\bpalliative\b", r"\bhospice\b", r"\bbed.?ridden\b",
-            r"\bventilat", r"\btransition\s*care\b", r"\bspinal\s*cord\b",
-            r"\btraumatic\s*brain\b", r"\bicu\b",
-        ])
-        if has_physio_name and not has_post_hospital:
-            return "Other", True, "pure physio reclassified"
+    if post_hospital:
+        if PHYSIO_NAME_ANY.search(name_lower):
+            if has_post_hospital is None:
+                has_post_hospital = POST_HOSPITAL_ANY.search(combined) is not None
+            if not has_post_hospital and not PHYSIO_NEURO_ANY.search(combined):
+                return "Other", True, "pure physio reclassified"
 
     # ── Staffing/manpower agency → Other ──────────────────────────────────
-    staffing_patterns = [
-        r"\bstaffing\b",
-        r"\bmanpower\b",
-        r"\brecruitment\b",
-        r"\bplacement\b.*\b(agency|service|bureau)\b",
-    ]
-    if llm_category != "Other":
-        for pat in staffing_patterns:
-            if re.search(pat, combined):
-                return "Other", True, f"staffing/manpower reclassified: {pat}"
+    if STAFFING_ANY.search(combined):
+        pat = first_match(STAFFING_RES, combined)
+        return "Other", True, f"staffing/manpower reclassified: {pat.pattern}"
 
     # ── Medical equipment/supplies → Other ────────────────────────────────
-    equip_patterns = [
-        r"\b(wheelchair|oxygen\s*cylinder|medical\s*equipment)\b",
-        r"\b(surgical\s*item|medical\s*supply|medical\s*store)\b",
-        r"\b(equipment\s*rental|on\s*rent)\b",
-    ]
-    if llm_category != "Other":
-        for pat in equip_patterns:
-            if re.search(pat, name_lower):
-                return "Other", True, f"equipment/supplies reclassified: {pat}"
+    if EQUIP_ANY.search(name_lower):
+        pat = first_match(EQUIP_RES, name_lower)
+        return "Other", True, f"equipment/supplies reclassified: {pat.pattern}"
 
     # No correction needed
     return llm_category, False, ""
@@ -217,24 +311,77 @@ def post_llm_review(name, content, llm_category, llm_reason):
 
 # ─── Helper Functions ──────────────────────────────────────────────────────────
 
-def get_crawl_content(crawl_data, place_id):
-    """Get combined markdown content from crawl results."""
-    if place_id not in crawl_data:
-        return ""
-    entry = crawl_data[place_id]
-    pages = entry.get("pages", [])
+def load_json(filepath):
+    """Read a JSON file, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(filepath.read_bytes())
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def write_json(filepath, data, indent=True):
+    """Write data as UTF-8 JSON — indented for outputs, compact for the cache."""
+    if orjson is not None:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None))
+    else:
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2 if indent else None, ensure_ascii=False)
+
+
+def iter_crawl_entries():
+    """Yield (place_id, crawl_entry) pairs from CRAWL_FILE.
+
+    With ijson the file is parsed incrementally, so only the joined markdown
+    of each entry stays in memory; otherwise the whole dict is loaded first.
+    """
+    with open(CRAWL_FILE, "rb") as f:
+        if ijson is not None:
+            yield from ijson.kvitems(f, "")
+        elif orjson is not None:
+            yield from orjson.loads(f.read()).items()
+        else:
+            yield from json.load(f).items()
+
+
+def get_crawl_content(entry, max_chars=CONTENT_MAX_CHARS):
+    """Get combined markdown content from one crawl result entry, stopping
+    once max_chars are collected (no pass reads further than that).
+    """
     combined = []
-    for page in pages:
+    total = 0
+    for page in entry.get("pages", []):
         text = page.get("markdown", "")
         if text and len(text) > 50:
             combined.append(text)
-    return "\n\n".join(combined)
+            total += len(text) + 2
+            if total >= max_chars:
+                break
+    return "\n\n".join(combined)[:max_chars]
+
+
+class RateLimiter:
+    """Thread-safe rate limiter — spaces request starts across all workers."""
+
+    def __init__(self, min_interval: float = RATE_LIMIT_SECONDS):
+        self.min_interval = min_interval
+        self.next_request_time = 0.0
+        self.requests = 0  # Requests started so far
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            self.requests += 1
+            now = time.time()
+            start = max(now, self.next_request_time)
+            self.next_request_time = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
 
 
 def classify_llm(name, content, client):
     """Classify using GPT-4o-mini. Returns (category, confidence, reason)."""
     if content and len(content) > 200:
-        truncated = content[:4000]
+        truncated = content[:PROMPT_CONTENT_CHARS]
         content_section = f'Website content (truncated):\n"""\n{truncated}\n"""'
     else:
         content_section = "No website content available."
@@ -266,19 +413,70 @@ def classify_llm(name, content, client):
         return "Other", "none", f"LLM error: {str(e)[:80]}"
 
 
-# ─── Distance helpers ────────────────────────────────────────────────────────
+def prompt_key(name, content):
+    """Hash of what the per-entry prompt is built from, so entries sharing a
+    name and content excerpt (e.g. chain branches) are classified once.
+    """
+    excerpt = content[:PROMPT_CONTENT_CHARS] if content and len(content) > 200 else ""
+    return hashlib.blake2b(f"{name}\0{excerpt}".encode(), digest_size=16).hexdigest()
 
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Return distance in metres between two lat/lng points."""
-    R = 6_371_000  # Earth radius in metres
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlam = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
+def classify_llm_marshaled(rows, client):
+    """Classify several (name, content) rows in one request. Returns one
+    (category, confidence, reason) per row, in order, or None if the reply
+    was not valid JSON (the caller retries with smaller chunks).
+    """
+    blocks = []
+    for i, (name, content) in enumerate(rows, 1):
+        if content and len(content) > 200:
+            snippet = content[:MARSHAL_CONTENT_CHARS]
+            blocks.append(f'{i}. Business name: "{name}"\nWebsite content (truncated):\n"""\n{snippet}\n"""')
+        else:
+            blocks.append(f'{i}. Business name: "{name}"\nNo website content available.')
+
+    prompt = MARSHAL_PROMPT.format(count=len(rows), rows="\n\n".join(blocks))
+    try:
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=80 * len(rows),
+            response_format={"type": "json_object"},
+        )
+    except Exception as e:
+        return [("Other", "none", f"LLM error: {str(e)[:80]}")] * len(rows)
+
+    try:
+        by_id = {r.get("id"): r for r in json.loads(response.choices[0].message.content).get("results", [])}
+    except (ValueError, AttributeError):
+        return None
+
+    labels = []
+    for i in range(1, len(rows) + 1):
+        result = by_id.get(i)
+        if result is None:
+            labels.append(("Other", "none", "LLM error: row missing from response"))
+        else:
+            labels.append((
+                result.get("category", "Other"),
+                result.get("confidence", "low"),
+                result.get("reason", ""),
+            ))
+    return labels
+
+
+# ─── Distance helpers ────────────────────────────────────────────────────────
 
+EARTH_RADIUS_M = 6_371_000
 DEDUP_DISTANCE_M = 200  # Only dedup if within this distance
+# DEDUP_DISTANCE_M as a latitude span in radians (with a little slack for
+# rounding), and as the haversine term a = sin²(d / 2R) that pairs are
+# compared against, so the distance itself is never computed
+MAX_DEDUP_DPHI = DEDUP_DISTANCE_M / EARTH_RADIUS_M * 1.01
+MAX_DEDUP_HAV = math.sin(DEDUP_DISTANCE_M / (2 * EARTH_RADIUS_M)) ** 2
+
+# Stripped from lowercased names before grouping them for dedup
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]")
 
 
 def cluster_by_proximity(pids: list, all_data: dict) -> list[list[str]]:
@@ -299,28 +497,41 @@ def cluster_by_proximity(pids: list, all_data: dict) -> list[list[str]]:
         else:
             no_coords.append(pid)
 
-    # Simple greedy clustering
-    remaining = set(coords.keys())
-    clusters: list[list[str]] = []
-
-    while remaining:
-        seed = remaining.pop()
-        cluster = [seed]
-        # Find all entries close to any member of this cluster
-        changed = True
-        while changed:
-            changed = False
-            for pid in list(remaining):
-                lat1, lon1 = coords[seed]
-                # Check distance to any existing cluster member
-                for member in cluster:
-                    lat2, lon2 = coords[member]
-                    if haversine_m(coords[pid][0], coords[pid][1], lat2, lon2) <= DEDUP_DISTANCE_M:
-                        cluster.append(pid)
-                        remaining.discard(pid)
-                        changed = True
-                        break
-        clusters.append(cluster)
+    # Union-find over the pairs within range: each pair is tested once,
+    # instead of rescanning the remaining entries against every cluster
+    # member until nothing changes. The per-point radians and cosines are
+    # hoisted out of the pair loop, and the haversine term is compared
+    # against the threshold directly (no atan2).
+    pid_list = list(coords)
+    trig = {}
+    for pid, (lat, lng) in coords.items():
+        phi = math.radians(lat)
+        trig[pid] = (phi, math.radians(lng), math.cos(phi))
+    parent = {pid: pid for pid in pid_list}
+
+    def find(pid):
+        while parent[pid] != pid:
+            parent[pid] = parent[parent[pid]]
+            pid = parent[pid]
+        return pid
+
+    for i, a in enumerate(pid_list):
+        phi1, lam1, cos1 = trig[a]
+        for b in pid_list[i + 1:]:
+            phi2, lam2, cos2 = trig[b]
+            # Points further apart in latitude alone can't be within range
+            if abs(phi2 - phi1) > MAX_DEDUP_DPHI:
+                continue
+            hav = math.sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * math.sin((lam2 - lam1) / 2) ** 2
+            if hav <= MAX_DEDUP_HAV:
+                parent[find(a)] = find(b)
+
+    # Clusters keep the input order of their members, so score ties go to
+    # the entry listed first
+    by_root: dict[str, list[str]] = {}
+    for pid in pid_list:
+        by_root.setdefault(find(pid), []).append(pid)
+    clusters = list(by_root.values())
 
     # Entries without coordinates → each is its own cluster (not deduped)
     for pid in no_coords:
@@ -332,27 +543,63 @@ def cluster_by_proximity(pids: list, all_data: dict) -> list[list[str]]:
 # ─── Main ──────────────────────────────────────────────────────────────────────
 
 def main():
+    parser = argparse.ArgumentParser(description="Stage 2 classification: LLM + post-review + dedup")
+    parser.add_argument("--marshal", action="store_true",
+                        help=f"Classify up to {MARSHAL_ROWS} uncached entries per LLM request")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("  STAGE 2 CLASSIFIER — LLM + Post-Review")
     print("=" * 70)
 
     # Load data
-    with open(FILTERED_FILE) as f:
-        all_data = json.load(f)
-    with open(CRAWL_FILE) as f:
-        crawl_data = json.load(f)
+    all_data = load_json(FILTERED_FILE)
+
+    # Both passes read the same combined markdown — assemble it once per entry
+    content_by_pid = dict.fromkeys(all_data, "")
+    for pid, entry in iter_crawl_entries():
+        if pid in content_by_pid:
+            content_by_pid[pid] = get_crawl_content(entry)
 
     print(f"\n  Total entries: {len(all_data)}")
 
     # Load cache
     cache = {}
     if CACHE_FILE.exists():
-        with open(CACHE_FILE) as f:
-            cache = json.load(f)
+        cache = load_json(CACHE_FILE)
+        # Drop name-rule verdicts older runs stored as if the LLM had given them
+        cache = {pid: e for pid, e in cache.items() if not (e.get("llm_reason") or "").startswith("name rule: ")}
         print(f"  Loaded cache: {len(cache)} entries")
 
+    # Entries caught by a name rule are left to Pass 2 (never cached, so a rule
+    # change takes effect on the next run), and entries whose prompt was
+    # already answered (cached, or earlier in this run) reuse that answer —
+    # neither makes another call
+    by_prompt = {e["prompt_key"]: e for e in cache.values() if "prompt_key" in e}
+    prompt_keys = {}
+    pending = set()
+    uncached = []
+    duplicates = []  # share a prompt with an entry in uncached
+    reused = 0
+    name_ruled = set()
+    for pid in all_data:
+        if pid in cache:
+            continue
+        name = all_data[pid].get("name", "")
+        if NAME_RULE_ANY.search(name.lower()):
+            name_ruled.add(pid)
+            continue
+        key = prompt_keys[pid] = prompt_key(name, content_by_pid[pid])
+        if key in by_prompt:
+            cache[pid] = dict(by_prompt[key])
+            reused += 1
+        elif key in pending:
+            duplicates.append(pid)
+        else:
+            pending.add(key)
+            uncached.append(pid)
+
     # Check if we need API calls
-    uncached = [pid for pid in all_data if pid not in cache]
     client = None
     if uncached:
         if not OPENAI_API_KEY:
@@ -372,52 +619,81 @@ def main():
     print(f"\n  --- Pass 1: LLM Classification ---")
 
     total = len(all_data)
-    new_calls = 0
-    cached_hits = 0
+    new_entries = 0
+    cached_hits = total - len(uncached)
     errors = 0
     start_time = time.time()
 
-    for i, (pid, place) in enumerate(all_data.items()):
-        if pid in cache:
-            cached_hits += 1
-            continue
-
-        name = place.get("name", "")
-        content = get_crawl_content(crawl_data, pid)
-        category, confidence, reason = classify_llm(name, content, client)
-
-        if category not in CATEGORIES:
-            category = "Other"
-
-        cache[pid] = {
-            "name": name,
-            "llm_category": category,
-            "llm_confidence": confidence,
-            "llm_reason": reason,
-            "has_content": len(content) > 200,
-        }
-        new_calls += 1
-
-        if new_calls % 100 == 0:
-            elapsed = time.time() - start_time
-            rate = new_calls / elapsed * 60
-            remaining = (total - cached_hits - new_calls) / rate if rate > 0 else 0
-            print(f"    {cached_hits + new_calls}/{total} "
-                  f"({new_calls} new, {rate:.0f}/min, ~{remaining:.1f}min left)")
-            # Save cache periodically
-            with open(CACHE_FILE, "w") as f:
-                json.dump(cache, f, ensure_ascii=False)
-
-        # Rate limit
-        time.sleep(0.12)
+    rate_limiter = RateLimiter()
+
+    def classify_one(pid):
+        name = all_data[pid].get("name", "")
+        content = content_by_pid[pid]
+        rate_limiter.wait()
+        return pid, name, content, classify_llm(name, content, client)
+
+    def classify_chunk(pids):
+        rows = [(all_data[pid].get("name", ""), content_by_pid[pid]) for pid in pids]
+        rate_limiter.wait()
+        labels = classify_llm_marshaled(rows, client)
+        if labels is None:
+            # Malformed reply — retry as two halves, down to single entries
+            if len(pids) == 1:
+                return [classify_one(pids[0])]
+            half = len(pids) // 2
+            return classify_chunk(pids[:half]) + classify_chunk(pids[half:])
+        return [(pid, name, content, label) for pid, (name, content), label in zip(pids, rows, labels)]
+
+    # map() yields in submission order, so the cache is filled in the same
+    # order as before while up to LLM_WORKERS requests are in flight
+    pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+    try:
+        if args.marshal:
+            chunks = [uncached[i:i + MARSHAL_ROWS] for i in range(0, len(uncached), MARSHAL_ROWS)]
+            classified = (row for rows in pool.map(classify_chunk, chunks) for row in rows)
+        else:
+            classified = pool.map(classify_one, uncached)
+        for pid, name, content, (category, confidence, reason) in classified:
+            if category not in CATEGORIES:
+                category = "Other"
+
+            cache[pid] = {
+                "name": name,
+                "llm_category": category,
+                "llm_confidence": confidence,
+                "llm_reason": reason,
+                "has_content": len(content) > 200,
+                "prompt_key": prompt_keys[pid],
+            }
+            by_prompt[prompt_keys[pid]] = cache[pid]
+            new_entries += 1
+
+            if new_entries % 100 == 0:
+                elapsed = time.time() - start_time
+                rate = new_entries / elapsed * 60
+                remaining = (total - cached_hits - new_entries) / rate if rate > 0 else 0
+                print(f"    {cached_hits + new_entries}/{total} "
+                      f"({new_entries} new, {rate:.0f} entries/min, ~{remaining:.1f}min left)")
+                # Save cache periodically
+                write_json(CACHE_FILE, cache, indent=False)
+    finally:
+        # On Ctrl-C, drop the queued calls instead of running (and paying for) them all
+        pool.shutdown(cancel_futures=True)
+
+    for pid in duplicates:
+        cache[pid] = dict(by_prompt[prompt_keys[pid]])
+        reused += 1
 
     # Final cache save
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f, ensure_ascii=False)
+    write_json(CACHE_FILE, cache, indent=False)
 
     elapsed = time.time() - start_time
-    print(f"\n  Pass 1 complete: {new_calls} new API calls, "
-          f"{cached_hits} cached, {elapsed:.1f}s")
+    print(f"\n  Pass 1 complete: {new_entries} newly classified entries "
+          f"({rate_limiter.requests} API calls), {cached_hits} cached, {elapsed:.1f}s")
+    if reused:
+        print(f"  Reused {reused} answers for identical prompts")
+    if name_ruled:
+        print(f"  Skipped {len(name_ruled)} entries caught by name rules (no API call)")
 
     # ── Pass 2: Post-LLM Review ──────────────────────────────────────────
     print(f"\n  --- Pass 2: Post-LLM Automated Review ---")
@@ -430,12 +706,18 @@ def main():
 
     for pid, place in all_data.items():
         name = place.get("name", "")
-        content = get_crawl_content(crawl_data, pid)
+        content = content_by_pid[pid]
 
-        cached = cache.get(pid, {})
-        llm_cat = cached.get("llm_category", "Other")
-        llm_conf = cached.get("llm_confidence", "none")
-        llm_reason = cached.get("llm_reason", "")
+        if pid in name_ruled:
+            # Never sent to the LLM; the review's name rules move it to Other
+            llm_cat, llm_conf, llm_reason = "n/a", "n/a", ""
+            has_content = len(content) > 200
+        else:
+            cached = cache.get(pid, {})
+            llm_cat = cached.get("llm_category", "Other")
+            llm_conf = cached.get("llm_confidence", "none")
+            llm_reason = cached.get("llm_reason", "")
+            has_content = cached.get("has_content", False)
 
         cat_counts_before[llm_cat] += 1
 
@@ -458,7 +740,7 @@ def main():
             "llm_reason": llm_reason,
             "corrected": corrected,
             "correction_reason": correction_reason if corrected else "",
-            "has_content": cached.get("has_content", False),
+            "has_content": has_content,
             "_found_in_city": place.get("_found_in_city", place.get("_search_city", "")),
         }
 
@@ -471,7 +753,9 @@ def main():
     # ── Pass 3: Deduplication ─────────────────────────────────────────────
     print(f"\n  --- Pass 3: Deduplication (classified entries only) ---")
 
-    classified_pids = {pid for pid, r in results.items() if r["category"] != "Other"}
+    # A list in input order (not a set) so groups — and score tie-breaks
+    # within them — come out the same on every run
+    classified_pids = [pid for pid, r in results.items() if r["category"] != "Other"]
 
     def get_domain(pid):
         place = all_data.get(pid, {})
@@ -489,14 +773,17 @@ def main():
         reviews = place.get("reviews", 0) or 0
         return (reviews, rating)
 
+    # Keys used by both dedup passes, computed once per classified entry
+    scores = {pid: get_score(pid) for pid in classified_pids}
+    cities = {pid: results[pid].get("_found_in_city", "") for pid in classified_pids}
+
     # Pass 3a: Dedup by (domain, city)
     from collections import defaultdict
     domain_city_groups = defaultdict(list)
     for pid in classified_pids:
         domain = get_domain(pid)
-        city = results[pid].get("_found_in_city", "")
         if domain:
-            domain_city_groups[(domain, city)].append(pid)
+            domain_city_groups[(domain, cities[pid])].append(pid)
 
     removed_domain = set()
     for (domain, city), pids in domain_city_groups.items():
@@ -507,17 +794,16 @@ def main():
         for cluster in clusters:
             if len(cluster) <= 1:
                 continue
-            cluster_sorted = sorted(cluster, key=lambda p: get_score(p), reverse=True)
+            cluster_sorted = sorted(cluster, key=scores.__getitem__, reverse=True)
             for pid in cluster_sorted[1:]:
                 removed_domain.add(pid)
 
     # Pass 3b: Dedup by (normalized_name, city) on remaining
-    remaining = classified_pids - removed_domain
+    remaining = [pid for pid in classified_pids if pid not in removed_domain]
     name_city_groups = defaultdict(list)
     for pid in remaining:
-        norm_name = re.sub(r"[^a-z0-9]", "", results[pid]["name"].lower())
-        city = results[pid].get("_found_in_city", "")
-        name_city_groups[(norm_name, city)].append(pid)
+        norm_name = NON_ALNUM_RE.sub("", results[pid]["name"].lower())
+        name_city_groups[(norm_name, cities[pid])].append(pid)
 
     removed_name = set()
     for (norm, city), pids in name_city_groups.items():
@@ -528,7 +814,7 @@ def main():
         for cluster in clusters:
             if len(cluster) <= 1:
                 continue
-            cluster_sorted = sorted(cluster, key=lambda p: get_score(p), reverse=True)
+            cluster_sorted = sorted(cluster, key=scores.__getitem__, reverse=True)
             for pid in cluster_sorted[1:]:
                 removed_name.add(pid)
 
@@ -594,8 +880,7 @@ def main():
               f"({classified/total_city*100:.0f}%)")
 
     # Save results
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    write_json(OUTPUT_FILE, results)
 
     print(f"\n  Output: {OUTPUT_FILE}")
     print(f"  Cache:  {CACHE_FILE}")
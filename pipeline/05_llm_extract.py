@@ -34,15 +34,32 @@ Writes:
 Usage:
     export OPENAI_API_KEY="your-key-here"
     python pipeline/05_llm_extract.py
+    python pipeline/05_llm_extract.py --batch   # one Batch API job (cold runs)
+    python pipeline/05_llm_extract.py --token-budget   # cut content by tokens (tiktoken)
+    python pipeline/05_llm_extract.py --marshal   # several GENERATE entries per request
 """
 
+import argparse
+import hashlib
 import json
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from collections import Counter
+from collections import Counter, defaultdict
+
+try:
+    import orjson  # Optional: much faster data loads, cache checkpoints and output writes
+except ImportError:
+    orjson = None
+
+try:
+    import tiktoken  # Optional: cut crawl content on token boundaries (--token-budget)
+except ImportError:
+    tiktoken = None
 
 # ─── Configuration ────────────────────────────────────────────────────────────
 DATA_DIR = Path(__file__).parent / "data"
@@ -55,11 +72,29 @@ TAGS_FILE = CONFIG_DIR / "master_tags.json"
 
 OUTPUT_FILE = DATA_DIR / "llm_extracted.json"
 CACHE_FILE = DATA_DIR / "llm_extract_cache.json"
+BATCH_INPUT_FILE = DATA_DIR / "llm_extract_batch_input.jsonl"
+BATCH_POLL_SECONDS = 30
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_MODEL = "gpt-4o-mini"
 
+# Calls are latency-bound (several seconds for a full extraction), so keep
+# several in flight while the shared rate limiter holds the pool as a whole
+# under the RPM quota
+LLM_WORKERS = 16
+LLM_RPM = 500
+RATE_LIMIT_SECONDS = 60 / LLM_RPM
+JSON_RETRIES = 2  # follow-up turns asking the model to fix a malformed reply
+
+# --marshal: up to MARSHAL_ROWS GENERATE entries per request. Their prompts
+# are a few lines of Google data, so the per-request overhead dominates;
+# EXTRACT entries carry up to MAX_CONTENT_CHARS each and stay one per request
+MARSHAL_ROWS = 10
+
+PROGRESS_EVERY = 10  # progress line every N results (every result with --verbose)
+
 MAX_CONTENT_CHARS = 8000   # max website chars to send to LLM
+MAX_CONTENT_TOKENS = 3500  # token budget for website content with --token-budget
 MIN_USEFUL_CONTENT = 200   # minimum chars to consider content useful
 
 ACTIVE_CATEGORIES = {"Nursing Homes", "Elder Care", "Post-Hospital Care", "Home Health Care"}
@@ -69,8 +104,7 @@ ACTIVE_CATEGORIES = {"Nursing Homes", "Elder Care", "Post-Hospital Care", "Home
 
 def load_tag_taxonomy():
     """Load master tags and build flat canonical name lists for each group."""
-    with open(TAGS_FILE) as f:
-        tags = json.load(f)
+    tags = load_json(TAGS_FILE)
 
     taxonomy = {}
     for group in ("specialities", "services", "facility_features"):
@@ -96,11 +130,14 @@ def build_tag_list_for_prompt(taxonomy):
 
 
 # ─── Prompts ──────────────────────────────────────────────────────────────────
+# Instructions and the tag list go in the system message, which is the same
+# for every call, and the listing data goes in the user message. OpenAI
+# caches a shared prompt prefix, so the long static part is billed at the
+# cached rate after the first few calls.
 
-EXTRACTION_PROMPT = """You are a healthcare facility data extraction expert for Karo Care, an Indian healthcare directory.
+EXTRACTION_SYSTEM = """You are a healthcare facility data extraction expert for Karo Care, an Indian healthcare directory.
 
-Analyze the following data for "{name}" located in {city}, India.
-Category: {category}
+Analyze the business data and website content you are given for one listing located in India.
 
 Your job is to extract structured listing data. Use ONLY information from the provided data — do not fabricate.
 
@@ -139,17 +176,6 @@ INSTRUCTIONS:
 ALLOWED TAGS:
 {tag_list}
 
---- BUSINESS DATA ---
-Name: {name}
-Address: {address}
-Phone: {phone}
-Rating: {rating} ({reviews} reviews)
-Working Hours: {hours}
-Google Category: {google_type}
-
---- WEBSITE CONTENT ---
-{content}
-
 Respond with ONLY valid JSON:
 {{
   "description": "...",
@@ -161,13 +187,10 @@ Respond with ONLY valid JSON:
   "trust_signals": ["signal1", "signal2"]
 }}"""
 
-
-GENERATION_PROMPT = """You are a healthcare facility content writer for Karo Care, an Indian healthcare directory.
-
-Generate a minimal listing for "{name}" located in {city}, India.
+EXTRACTION_USER = """Analyze the following data for "{name}" located in {city}, India.
 Category: {category}
 
-AVAILABLE DATA:
+--- BUSINESS DATA ---
 Name: {name}
 Address: {address}
 Phone: {phone}
@@ -175,6 +198,14 @@ Rating: {rating} ({reviews} reviews)
 Working Hours: {hours}
 Google Category: {google_type}
 
+--- WEBSITE CONTENT ---
+{content}"""
+
+
+GENERATION_SYSTEM = """You are a healthcare facility content writer for Karo Care, an Indian healthcare directory.
+
+Generate a minimal listing for the business you are given, located in India, from its name, category and Google data only.
+
 INSTRUCTIONS:
 1. **description**: Write a brief 50-100 word description based ONLY on what can be reasonably inferred from the name, category, and city. Be factual and general — do NOT fabricate specific claims.
 
@@ -208,11 +239,58 @@ Respond with ONLY valid JSON:
   "trust_signals": []
 }}"""
 
+GENERATION_USER = """Generate a minimal listing for "{name}" located in {city}, India.
+Category: {category}
+
+AVAILABLE DATA:
+Name: {name}
+Address: {address}
+Phone: {phone}
+Rating: {rating} ({reviews} reviews)
+Working Hours: {hours}
+Google Category: {google_type}"""
+
+GENERATION_MARSHAL_USER = """Generate a minimal listing for each of these {count} businesses independently:
+
+{rows}
+
+Respond with ONLY a JSON object with one listing per business, using its number as "id":
+{{"results": [{{"id": <number>, "description": "...", "specialities": [], "services": [], "facility_features": [], "facility_type": "...", "bed_count": null, "trust_signals": []}}]}}"""
+
+GENERATION_MARSHAL_ROW = """{id}. "{name}" located in {city}, India.
+Category: {category}
+Address: {address}
+Phone: {phone}
+Rating: {rating} ({reviews} reviews)
+Working Hours: {hours}
+Google Category: {google_type}"""
+
 
 # ─── Helper Functions ─────────────────────────────────────────────────────────
 
-def get_crawl_content(crawl_data, place_id):
-    """Combine all successful crawled pages into a single content string."""
+def load_json(filepath):
+    """Read a JSON file, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(filepath.read_bytes())
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def write_json(filepath, data, indent=True):
+    """Write data as UTF-8 JSON — indented for outputs, compact for the cache."""
+    if orjson is not None:
+        filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None))
+    else:
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2 if indent else None, ensure_ascii=False)
+
+
+def get_crawl_content(crawl_data, place_id, encoder=None):
+    """
+    Combine all successful crawled pages into a single content string.
+    With a tiktoken encoder the cut is MAX_CONTENT_TOKENS tokens instead of
+    MAX_CONTENT_CHARS chars, so Devanagari-heavy pages get a fair share.
+    """
     if place_id not in crawl_data:
         return ""
     entry = crawl_data[place_id]
@@ -223,8 +301,21 @@ def get_crawl_content(crawl_data, place_id):
         if md and len(md) > 50:
             url = page.get("url", "")
             parts.append(f"--- PAGE: {url} ---\n{md}")
-    combined = "\n\n".join(parts)
-    return combined[:MAX_CONTENT_CHARS]
+    if encoder is None:
+        combined = "\n\n".join(parts)
+        return combined[:MAX_CONTENT_CHARS]
+
+    kept = []
+    remaining = MAX_CONTENT_TOKENS
+    for part in parts:
+        chunk = f"\n\n{part}" if kept else part
+        tokens = encoder.encode(chunk)
+        if len(tokens) > remaining:
+            kept.append(encoder.decode(tokens[:remaining]))
+            break
+        kept.append(chunk)
+        remaining -= len(tokens)
+    return "".join(kept)
 
 
 def compute_premium(extracted, has_content, rating, reviews):
@@ -277,38 +368,74 @@ def compute_premium(extracted, has_content, rating, reviews):
     return score >= 6
 
 
-def validate_tags(extracted, taxonomy):
-    """Remove any tags that aren't in the master taxonomy."""
-    for group in ("specialities", "services", "facility_features"):
-        allowed = set(taxonomy[group])
+TAG_KEY_RE = re.compile(r"[^a-z0-9]+")
+
+
+def tag_key(tag):
+    """Match key for a tag — case, spacing and punctuation ignored, & read as "and"."""
+    return TAG_KEY_RE.sub("", tag.lower().replace("&", "and"))
+
+
+def validate_tags(extracted, canonical_by_group):
+    """
+    Map returned tags onto the master taxonomy ({tag_key: canonical} per
+    group), so near-misses like "Nutrition and Diet" keep their canonical
+    name; anything else is dropped.
+    """
+    for group, canonical in canonical_by_group.items():
         raw = extracted.get(group, [])
         if not isinstance(raw, list):
             raw = []
-        cleaned = [t for t in raw if t in allowed]
+        cleaned = []
+        for t in raw:
+            name = canonical.get(tag_key(t)) if isinstance(t, str) else None
+            if name and name not in cleaned:
+                cleaned.append(name)
         extracted[group] = cleaned
     return extracted
 
 
+def request_key(request):
+    """Hash of a request body — identifies the inputs a cached result came from."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
 def load_cache():
     """Load extraction cache for resume support."""
     if CACHE_FILE.exists():
-        with open(CACHE_FILE) as f:
-            return json.load(f)
+        return load_json(CACHE_FILE)
     return {}
 
 
 def save_cache(cache):
     """Save extraction cache."""
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f, ensure_ascii=False)
+    write_json(CACHE_FILE, cache, indent=False)
 
 
 # ─── LLM Calls ───────────────────────────────────────────────────────────────
 
-def extract_with_llm(client, name, city, category, address, phone, rating,
-                     reviews, hours, google_type, content, tag_list):
-    """Use GPT-4o-mini to extract structured data from crawled content."""
-    prompt = EXTRACTION_PROMPT.format(
+class RateLimiter:
+    """Thread-safe rate limiter — spaces request starts across all workers."""
+
+    def __init__(self, min_interval: float = RATE_LIMIT_SECONDS):
+        self.min_interval = min_interval
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_request_time)
+            self.next_request_time = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def extraction_request(name, city, category, address, phone, rating,
+                       reviews, hours, google_type, content, system):
+    """Chat-completion request body for an EXTRACT entry (online + batch).
+    `system` is EXTRACTION_SYSTEM with the tag list filled in."""
+    prompt = EXTRACTION_USER.format(
         name=name,
         city=city,
         category=category,
@@ -319,29 +446,24 @@ def extract_with_llm(client, name, city, category, address, phone, rating,
         hours=hours or "Not available",
         google_type=google_type or "",
         content=content,
-        tag_list=tag_list,
     )
-
-    try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=2000,
-            response_format={"type": "json_object"},
-        )
-        result = json.loads(response.choices[0].message.content)
-        result["_source"] = "extracted"
-        return result
-    except Exception as e:
-        print(f"    ✗ LLM extraction error: {e}")
-        return {"_source": "error", "_error": str(e)}
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 2000,
+        "response_format": {"type": "json_object"},
+    }
 
 
-def generate_with_llm(client, name, city, category, address, phone, rating,
-                      reviews, hours, google_type, tag_list):
-    """Use GPT-4o-mini to generate minimal listing content."""
-    prompt = GENERATION_PROMPT.format(
+def generation_request(name, city, category, address, phone, rating,
+                       reviews, hours, google_type, system):
+    """Chat-completion request body for a GENERATE entry (online + batch).
+    `system` is GENERATION_SYSTEM with the tag list filled in."""
+    prompt = GENERATION_USER.format(
         name=name,
         city=city,
         category=category,
@@ -351,28 +473,199 @@ def generate_with_llm(client, name, city, category, address, phone, rating,
         reviews=reviews or 0,
         hours=hours or "Not available",
         google_type=google_type or "",
-        tag_list=tag_list,
     )
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 1000,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def complete_json(client, request):
+    """
+    Run a chat completion and parse its reply as a JSON object. A malformed
+    reply goes back to the model with the parse error, up to JSON_RETRIES
+    times, instead of losing the entry.
+    """
+    messages = request["messages"]
+    for attempt in range(JSON_RETRIES + 1):
+        response = client.chat.completions.create(**{**request, "messages": messages})
+        raw = response.choices[0].message.content
+        try:
+            result = json.loads(raw)
+            if not isinstance(result, dict):
+                raise ValueError("reply is not a JSON object")
+            for group in ("specialities", "services", "facility_features"):
+                if not isinstance(result.get(group, []), list):
+                    raise ValueError(f'"{group}" must be a list')
+            return result
+        except ValueError as e:
+            if attempt == JSON_RETRIES:
+                raise
+            messages = messages + [
+                {"role": "assistant", "content": raw or ""},
+                {"role": "user", "content": f"Your output had error: {e}. Fix it and respond with ONLY valid JSON in the format above."},
+            ]
+            time.sleep(1.0 * (attempt + 1))
+
+
+def extract_with_llm(client, name, city, category, address, phone, rating,
+                     reviews, hours, google_type, content, system):
+    """Use GPT-4o-mini to extract structured data from crawled content."""
+    request = extraction_request(name, city, category, address, phone, rating,
+                                 reviews, hours, google_type, content, system)
+    try:
+        result = complete_json(client, request)
+        result["_source"] = "extracted"
+        return result
+    except Exception as e:
+        print(f"    ✗ LLM extraction error: {e}")
+        return {"_source": "error", "_error": str(e)}
+
 
+def generate_with_llm(client, name, city, category, address, phone, rating,
+                      reviews, hours, google_type, system):
+    """Use GPT-4o-mini to generate minimal listing content."""
+    request = generation_request(name, city, category, address, phone, rating,
+                                 reviews, hours, google_type, system)
+    try:
+        result = complete_json(client, request)
+        result["_source"] = "generated"
+        return result
+    except Exception as e:
+        print(f"    ✗ LLM generation error: {e}")
+        return {"_source": "error", "_error": str(e)}
+
+
+def generate_marshaled(client, rows, system):
+    """
+    Generate several GENERATE entries (prompt field tuples) in one request.
+    Returns one result per row, in order, with None for rows missing from
+    the reply; returns None if the reply was not valid JSON (the caller
+    retries with smaller chunks).
+    """
+    blocks = []
+    for i, (name, city, category, address, phone, rating,
+            reviews, hours, google_type) in enumerate(rows, 1):
+        blocks.append(GENERATION_MARSHAL_ROW.format(
+            id=i,
+            name=name,
+            city=city,
+            category=category,
+            address=address or "",
+            phone=phone or "",
+            rating=rating or "N/A",
+            reviews=reviews or 0,
+            hours=hours or "Not available",
+            google_type=google_type or "",
+        ))
+    prompt = GENERATION_MARSHAL_USER.format(count=len(rows), rows="\n\n".join(blocks))
     try:
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
             temperature=0.2,
-            max_tokens=1000,
+            max_tokens=500 * len(rows),
             response_format={"type": "json_object"},
         )
-        result = json.loads(response.choices[0].message.content)
-        result["_source"] = "generated"
-        return result
     except Exception as e:
         print(f"    ✗ LLM generation error: {e}")
-        return {"_source": "error", "_error": str(e)}
+        return [{"_source": "error", "_error": str(e)}] * len(rows)
+
+    try:
+        by_id = {r.get("id"): r for r in json.loads(response.choices[0].message.content).get("results", [])}
+    except (ValueError, AttributeError):
+        return None
+
+    results = []
+    for i in range(1, len(rows) + 1):
+        result = by_id.get(i)
+        if isinstance(result, dict):
+            result = {k: v for k, v in result.items() if k != "id"}
+            result["_source"] = "generated"
+        else:
+            result = None
+        results.append(result)
+    return results
+
+
+def run_batch(client, requests):
+    """Send {pid: (source, request)} as one OpenAI Batch API job (half the
+    price, no RPM limit, results within the 24h window). Returns {pid: result}
+    — an error result for anything the batch did not answer.
+    """
+    with open(BATCH_INPUT_FILE, "w") as f:
+        for pid, (source, request) in requests.items():
+            f.write(json.dumps({
+                "custom_id": pid,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": request,
+            }, ensure_ascii=False) + "\n")
+
+    with open(BATCH_INPUT_FILE, "rb") as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    print(f"  Submitted batch {batch.id} ({len(requests)} requests)")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        print(f"    {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+
+    results = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            row = json.loads(line)
+            pid = row["custom_id"]
+            try:
+                body = row["response"]["body"]
+                result = json.loads(body["choices"][0]["message"]["content"])
+                result["_source"] = requests[pid][0]
+            except Exception as e:
+                result = {"_source": "error", "_error": str(e)}
+            results[pid] = result
+
+    # Requests missing from the output (batch failed/expired, per-request errors)
+    for pid in requests:
+        results.setdefault(pid, {"_source": "error", "_error": f"no batch result ({batch.status})"})
+    return results
 
 
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
+    parser = argparse.ArgumentParser(description="LLM structured extraction for active listings")
+    parser.add_argument("--batch", action="store_true",
+                        help="Send uncached entries as one OpenAI Batch API job instead of online calls")
+    parser.add_argument("--marshal", action="store_true",
+                        help=f"Generate up to {MARSHAL_ROWS} thin-content entries per LLM request (online calls only)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print a progress line for every processed entry")
+    parser.add_argument("--token-budget", action="store_true",
+                        help=f"Cut crawl content at {MAX_CONTENT_TOKENS} tokens instead of {MAX_CONTENT_CHARS} chars (needs tiktoken)")
+    args = parser.parse_args()
+
+    encoder = None
+    if args.token_budget:
+        if tiktoken is None:
+            print("  ERROR: --token-budget needs tiktoken. pip install tiktoken")
+            sys.exit(1)
+        encoder = tiktoken.encoding_for_model(OPENAI_MODEL)
+
     start_time = time.time()
 
     print("=" * 70)
@@ -383,23 +676,25 @@ def main():
     # ── Load data ─────────────────────────────────────────────────────────
     print("\n  Loading data...")
 
-    with open(STAGE1_FILE) as f:
-        stage1 = json.load(f)
+    stage1 = load_json(STAGE1_FILE)
     print(f"  Stage 1 places: {len(stage1)}")
 
-    with open(CLASSIFIED_FILE) as f:
-        classified = json.load(f)
+    classified = load_json(CLASSIFIED_FILE)
     print(f"  Stage 2 classified: {len(classified)}")
 
     crawl_data = {}
     if CRAWL_FILE.exists():
-        with open(CRAWL_FILE) as f:
-            crawl_data = json.load(f)
+        crawl_data = load_json(CRAWL_FILE)
     print(f"  Crawl results: {len(crawl_data)}")
 
     # Load tag taxonomy
     taxonomy = load_tag_taxonomy()
     tag_list = build_tag_list_for_prompt(taxonomy)
+    extraction_system = EXTRACTION_SYSTEM.format(tag_list=tag_list)
+    generation_system = GENERATION_SYSTEM.format(tag_list=tag_list)
+    canonical_by_group = {
+        group: {tag_key(name): name for name in names} for group, names in taxonomy.items()
+    }
     print(f"  Tags: {sum(len(v) for v in taxonomy.values())} canonical tags across 3 groups")
 
     # Filter to active listings only
@@ -414,10 +709,61 @@ def main():
     for cat in sorted(ACTIVE_CATEGORIES):
         print(f"    {cat:25s}: {cat_counts.get(cat, 0)}")
 
+    def prompt_inputs(pid):
+        """Prompt fields (name ... google_type) and crawl content for one entry."""
+        cls = classified[pid]
+        place = stage1.get(pid, {})
+
+        hours_list = place.get("working_hours_text", [])
+        fields = (
+            place.get("name", cls.get("name", "")),
+            cls.get("_found_in_city", place.get("_found_in_city", "")),
+            cls["category"],
+            place.get("formatted_address", ""),
+            place.get("phone", ""),
+            place.get("rating"),
+            place.get("reviews", 0),
+            "; ".join(hours_list) if hours_list else "",
+            place.get("primary_type_display", ""),
+        )
+        return fields, get_crawl_content(crawl_data, pid, encoder)
+
+    def build_request(pid):
+        """(fields, content, source, request body) for one entry."""
+        fields, content = prompt_inputs(pid)
+        if len(content) >= MIN_USEFUL_CONTENT:
+            return fields, content, "extracted", extraction_request(*fields, content, extraction_system)
+        return fields, content, "generated", generation_request(*fields, generation_system)
+
     # ── Load cache ────────────────────────────────────────────────────────
+    # A cached result is reused only if it came from the exact request we
+    # would send now — editing the prompt, tag list, model or crawl content
+    # re-extracts just the affected entries. Entries cached before keys were
+    # recorded are trusted as-is; failed calls cached by older runs are retried.
     cache = load_cache()
-    uncached = [pid for pid in active_pids if pid not in cache]
+    # The prompt inputs of uncached entries are kept in `prepared`, so the
+    # workers below don't rebuild them from stage1/classified/crawl_data.
+    request_keys = {}
+    prepared = {}
+    uncached = []
+    stale = 0
+    for pid in active_pids:
+        built = build_request(pid)
+        request_keys[pid] = request_key(built[3])
+        cached = cache.get(pid)
+        if cached is None:
+            uncached.append(pid)
+            prepared[pid] = built
+        elif cached.get("_source") == "error":
+            uncached.append(pid)
+            prepared[pid] = built
+        elif cached.get("_request_key", request_keys[pid]) != request_keys[pid]:
+            uncached.append(pid)
+            prepared[pid] = built
+            stale += 1
     print(f"\n  Already cached: {len(cache)}")
+    if stale:
+        print(f"  Stale (inputs changed): {stale}")
     print(f"  Need processing: {len(uncached)}")
 
     # ── Check API key ─────────────────────────────────────────────────────
@@ -442,71 +788,121 @@ def main():
     extracted_count = 0
     generated_count = 0
     error_count = 0
-    process_start = time.time()
-
-    for i, pid in enumerate(uncached):
-        cls = classified[pid]
-        place = stage1.get(pid, {})
-
-        name = place.get("name", cls.get("name", ""))
-        city = cls.get("_found_in_city", place.get("_found_in_city", ""))
-        category = cls["category"]
-        address = place.get("formatted_address", "")
-        phone = place.get("phone", "")
-        rating = place.get("rating")
-        reviews = place.get("reviews", 0)
-        hours_list = place.get("working_hours_text", [])
-        hours = "; ".join(hours_list) if hours_list else ""
-        google_type = place.get("primary_type_display", "")
-
-        # Get crawl content
-        content = get_crawl_content(crawl_data, pid)
+    # Failed calls go into this run's output but not the cache, so the next
+    # run retries them
+    errors = {}
+    # ETA from an EWMA of the time between results, which follows the
+    # current throughput instead of averaging in the first slow calls
+    last_result = time.monotonic()
+    result_interval = None
+
+    rate_limiter = RateLimiter()
+
+    def process(pid):
+        fields, content, source, request = prepared[pid]
         has_content = len(content) >= MIN_USEFUL_CONTENT
 
+        rate_limiter.wait()
         if has_content:
-            result = extract_with_llm(
-                client, name, city, category, address, phone,
-                rating, reviews, hours, google_type, content, tag_list,
-            )
+            result = extract_with_llm(client, *fields, content, extraction_system)
             mode = "EXTRACT"
-            extracted_count += 1
         else:
-            result = generate_with_llm(
-                client, name, city, category, address, phone,
-                rating, reviews, hours, google_type, tag_list,
-            )
+            result = generate_with_llm(client, *fields, generation_system)
             mode = "GENERATE"
-            generated_count += 1
-
-        if result.get("_source") == "error":
-            error_count += 1
-
-        # Validate tags against taxonomy
-        result = validate_tags(result, taxonomy)
-
-        # Compute premium flag
-        result["is_premium"] = compute_premium(result, has_content, rating, reviews)
-
-        # Store in cache
-        cache[pid] = result
-
-        # Progress
-        elapsed = time.time() - process_start
-        rate = (i + 1) / elapsed * 60 if elapsed > 0 else 0
-        remaining = (len(uncached) - i - 1) / rate if rate > 0 else 0
-
-        name_short = name[:40]
-        n_tags = len(result.get("specialities", [])) + len(result.get("services", []))
-        print(f"  [{i+1}/{len(uncached)}] {mode:8s} {name_short:40s} "
-              f"tags={n_tags:2d} premium={'Y' if result.get('is_premium') else 'N'} "
-              f"({rate:.0f}/min, ~{remaining:.0f}m left)")
-
-        # Save cache every 25 entries
-        if (i + 1) % 25 == 0:
-            save_cache(cache)
-
-        # Rate limit
-        time.sleep(0.15)
+        name, rating, reviews = fields[0], fields[5], fields[6]
+        return name, rating, reviews, has_content, mode, result
+
+    def process_chunk(pids):
+        """process() rows for several GENERATE entries answered by one request."""
+        inputs = [prepared[pid][0] for pid in pids]
+        rate_limiter.wait()
+        results = generate_marshaled(client, inputs, generation_system)
+        if results is None:
+            # Malformed reply — retry as two halves, down to single entries
+            if len(pids) == 1:
+                return [process(pids[0])]
+            half = len(pids) // 2
+            return process_chunk(pids[:half]) + process_chunk(pids[half:])
+        rows = []
+        for pid, fields, result in zip(pids, inputs, results):
+            if result is None:
+                rows.append(process(pid))  # missing from the reply
+            else:
+                rows.append((fields[0], fields[5], fields[6], False, "GENERATE", result))
+        return rows
+
+    def process_batch(pids):
+        """Same rows as process(), answered by one Batch API job."""
+        requests = {pid: (prepared[pid][2], prepared[pid][3]) for pid in pids}
+        results = run_batch(client, requests) if requests else {}
+        for pid in pids:
+            fields, content, source, request = prepared[pid]
+            has_content = len(content) >= MIN_USEFUL_CONTENT
+            mode = "EXTRACT" if has_content else "GENERATE"
+            yield fields[0], fields[5], fields[6], has_content, mode, results[pid]
+
+    # map() yields in submission order, so the cache and progress log keep
+    # the same order while up to LLM_WORKERS requests are in flight
+    pool = ThreadPoolExecutor(max_workers=LLM_WORKERS)
+    try:
+        if args.batch:
+            rows = process_batch(uncached)
+        elif args.marshal:
+            # EXTRACT entries one per request, then GENERATE entries in chunks;
+            # uncached is reordered to match so the zip below still lines up
+            units = [[pid] for pid in uncached if prepared[pid][2] == "extracted"]
+            generate = [pid for pid in uncached if prepared[pid][2] == "generated"]
+            units += [generate[i:i + MARSHAL_ROWS] for i in range(0, len(generate), MARSHAL_ROWS)]
+            uncached = [pid for unit in units for pid in unit]
+            rows = (row for unit_rows in pool.map(
+                lambda pids: process_chunk(pids) if prepared[pids[0]][2] == "generated" else [process(pids[0])],
+                units) for row in unit_rows)
+        else:
+            rows = pool.map(process, uncached)
+        for i, (pid, (name, rating, reviews, has_content, mode, result)) in enumerate(
+                zip(uncached, rows)):
+            if mode == "EXTRACT":
+                extracted_count += 1
+            else:
+                generated_count += 1
+
+            if result.get("_source") == "error":
+                error_count += 1
+
+            # Validate tags against taxonomy
+            result = validate_tags(result, canonical_by_group)
+
+            # Compute premium flag
+            result["is_premium"] = compute_premium(result, has_content, rating, reviews)
+
+            # Store in cache
+            if result.get("_source") == "error":
+                errors[pid] = result
+            else:
+                result["_request_key"] = request_keys[pid]
+                cache[pid] = result
+
+            # Progress
+            now = time.monotonic()
+            dt = now - last_result
+            last_result = now
+            result_interval = dt if result_interval is None else 0.9 * result_interval + 0.1 * dt
+            if args.verbose or (i + 1) % PROGRESS_EVERY == 0 or i + 1 == len(uncached):
+                rate = 60 / result_interval if result_interval > 0 else 0
+                remaining = result_interval * (len(uncached) - i - 1) / 60
+
+                name_short = name[:40]
+                n_tags = len(result.get("specialities", [])) + len(result.get("services", []))
+                print(f"  [{i+1}/{len(uncached)}] {mode:8s} {name_short:40s} "
+                      f"tags={n_tags:2d} premium={'Y' if result.get('is_premium') else 'N'} "
+                      f"({rate:.0f}/min, ~{remaining:.0f}m left)")
+
+            # Save cache every 25 entries
+            if (i + 1) % 25 == 0:
+                save_cache(cache)
+    finally:
+        # On Ctrl-C, drop the queued calls instead of running (and paying for) them all
+        pool.shutdown(cancel_futures=True)
 
     # Final cache save
     if uncached:
@@ -525,13 +921,15 @@ def main():
         "with_services": 0,
         "with_features": 0,
         "facility_types": Counter(),
-        "by_category": {},
+        "by_category": defaultdict(lambda: {"total": 0, "premium": 0, "tag_sum": 0}),
     }
+    spec_counts = Counter()
+    svc_counts = Counter()
 
     for pid in active_pids:
         cls = classified[pid]
         place = stage1.get(pid, {})
-        result = cache.get(pid)
+        result = errors.get(pid) or cache.get(pid)
 
         if not result:
             continue
@@ -591,21 +989,17 @@ def main():
         if listing["facility_features"]:
             stats["with_features"] += 1
         stats["facility_types"][listing["facility_type"]] += 1
+        spec_counts.update(listing["specialities"])
+        svc_counts.update(listing["services"])
 
-        if category not in stats["by_category"]:
-            stats["by_category"][category] = {
-                "total": 0, "premium": 0,
-                "avg_tags": 0, "tag_sum": 0,
-            }
-        stats["by_category"][category]["total"] += 1
+        cat_stats = stats["by_category"][category]
+        cat_stats["total"] += 1
         if listing["is_premium"]:
-            stats["by_category"][category]["premium"] += 1
-        n_tags = len(listing["specialities"]) + len(listing["services"]) + len(listing["facility_features"])
-        stats["by_category"][category]["tag_sum"] += n_tags
+            cat_stats["premium"] += 1
+        cat_stats["tag_sum"] += len(listing["specialities"]) + len(listing["services"]) + len(listing["facility_features"])
 
     # Save output
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    write_json(OUTPUT_FILE, output)
 
     # ── Summary ───────────────────────────────────────────────────────────
     elapsed = time.time() - start_time
@@ -642,18 +1036,10 @@ def main():
 
     # Top tags
     print(f"\n  --- Top 15 Speciality Tags ---")
-    spec_counts = Counter()
-    for listing in output.values():
-        for t in listing.get("specialities", []):
-            spec_counts[t] += 1
     for tag, count in spec_counts.most_common(15):
         print(f"    {tag:35s}: {count}")
 
     print(f"\n  --- Top 15 Service Tags ---")
-    svc_counts = Counter()
-    for listing in output.values():
-        for t in listing.get("services", []):
-            svc_counts[t] += 1
     for tag, count in svc_counts.most_common(15):
         print(f"    {tag:35s}: {count}")
 
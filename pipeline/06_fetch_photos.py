@@ -10,18 +10,26 @@ Writes: pipeline/data/places_photos.json  (place_id → photos array)
 
 Usage:
     export GOOGLE_PLACES_API_KEY="your-key-here"
-    python pipeline/06_fetch_photos.py [--limit N] [--dry-run]
+    python pipeline/06_fetch_photos.py [--limit N] [--dry-run] [--verbose] [--refresh-empty]
 """
 
 import argparse
 import json
 import os
 import sys
+import threading
 import time
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson  # Optional: much faster loads and checkpoint writes
+except ImportError:
+    orjson = None
 
 # ─── Configuration ────────────────────────────────────────────────────────────
 SCRIPT_DIR = Path(__file__).parent
@@ -36,38 +44,133 @@ API_BASE_URL = "https://places.googleapis.com/v1/places"
 # Only request photos metadata (Pro tier, included in free 35k/month)
 FIELD_MASK = "id,photos"
 
-RATE_LIMIT_SECONDS = 0.5
-
-
-class RateLimiter:
-    def __init__(self, min_interval: float = RATE_LIMIT_SECONDS):
-        self.min_interval = min_interval
-        self.last_request_time = 0.0
+# Token bucket: a sustained RATE_LIMIT_PER_SECOND (well inside the Places
+# per-minute quota) with bursts of up to RATE_LIMIT_BURST after a slow patch
+RATE_LIMIT_PER_SECOND = 5
+RATE_LIMIT_BURST = 10
+
+# Adaptive pacing: throttled or failing calls cut the rate, every success
+# wins a little back, up to RATE_LIMIT_PER_SECOND again
+RATE_LIMIT_MIN = 0.5
+RATE_INCREASE = 0.2          # requests/s added per successful call
+RATE_DECREASE_429 = 0.5      # rate multiplier on 429 Too Many Requests
+RATE_DECREASE_5XX = 0.75     # milder — a server error is a weaker quota signal
+
+# Requests in flight at once; the shared rate limiter still sets the pace,
+# the workers only overlap each call's round trip with the next one's wait
+PHOTO_WORKERS = 8
+
+# Checkpoint after CHECKPOINT_EVERY new places or CHECKPOINT_SECONDS,
+# whichever comes first — each save re-dumps both files in full
+CHECKPOINT_EVERY = 200
+CHECKPOINT_SECONDS = 60
+PROGRESS_EVERY = 25  # progress line every N places (every place with --verbose)
+
+# With --refresh-empty, places that came back with no photos are fetched
+# again once their last check is older than this
+EMPTY_TTL_DAYS = 30
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all workers. Each wait() takes a
+    token, sleeping until one has refilled if the bucket is empty. The rate
+    adapts: on_failure() cuts it and empties the bucket, on_success() raises
+    it again up to the starting rate."""
+
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND, capacity: float = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
     def wait(self):
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-        self.last_request_time = time.time()
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Take the token now; a negative balance queues this caller
+            # behind the earlier ones without holding the lock while it sleeps
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def on_failure(self, factor: float):
+        with self.lock:
+            self.rate = max(RATE_LIMIT_MIN, self.rate * factor)
+            self.tokens = min(self.tokens, 0)
+
+
+def load_json(filepath: Path):
+    """Read a JSON file, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(filepath.read_bytes())
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def write_json(filepath: Path, data) -> None:
+    """Atomically write data as indented UTF-8 JSON, with orjson when available.
+
+    Writes to a .tmp sibling and renames it into place, so a Ctrl-C mid-save
+    leaves the previous checkpoint intact rather than a truncated file.
+    """
+    tmp = filepath.with_suffix(filepath.suffix + ".tmp")
+    if orjson is not None:
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, filepath)
+
+
+def retry_after_seconds(response) -> float | None:
+    """Seconds from a Retry-After header, if the server sent a numeric one."""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
 
 
 class PhotoFetcher:
     """Fetches Google Places photo metadata for normalized businesses."""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, session: requests.Session | None = None,
+                 load_results: bool = True):
         self.api_key = api_key
-        self.rate_limiter = RateLimiter()
+        self.rate_limiter = TokenBucket()
+        # Every call goes to the same host, so one keep-alive session saves a
+        # TCP + TLS handshake per place; the auth headers are set on it once
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=PHOTO_WORKERS))
+        self.session = session
+        self.session.headers.update({
+            "X-Goog-Api-Key": api_key,
+            "X-Goog-FieldMask": FIELD_MASK,
+        })
         self.results: dict = {}
         self.cache: dict = {"completed_ids": [], "total_api_calls": 0}
         self.stats = Counter()
+        self.lock = threading.Lock()  # guards the API call counter across workers
 
         # Load LLM-extracted listings (keyed by google_place_id)
         if not LLM_FILE.exists():
             print(f"ERROR: {LLM_FILE} not found. Run 05_llm_extract.py first.")
             sys.exit(1)
 
-        with open(LLM_FILE) as f:
-            llm_data = json.load(f)
+        llm_data = load_json(LLM_FILE)
 
         # Extract place_id → name mapping
         self.place_ids = {}
@@ -78,39 +181,47 @@ class PhotoFetcher:
         print(f"  Loaded {len(llm_data)} LLM-extracted listings")
         print(f"  Unique Google Place IDs: {len(self.place_ids)}")
 
-        # Load existing results and cache
-        if OUTPUT_FILE.exists():
-            with open(OUTPUT_FILE) as f:
-                self.results = json.load(f)
+        # Load existing results and cache (a dry run only needs the cache)
+        if load_results and OUTPUT_FILE.exists():
+            self.results = load_json(OUTPUT_FILE)
             print(f"  Loaded {len(self.results)} existing photo records")
 
         if CACHE_FILE.exists():
-            with open(CACHE_FILE) as f:
-                self.cache = json.load(f)
+            self.cache = load_json(CACHE_FILE)
             print(f"  Loaded cache: {len(self.cache['completed_ids'])} already fetched")
 
+        # Records already in the results (e.g. merged in by hand or from a
+        # restored backup) count as fetched too, so they aren't paid for twice
+        completed = set(self.cache["completed_ids"])
+        missing = [pid for pid in self.results if pid not in completed]
+        if missing:
+            self.cache["completed_ids"].extend(missing)
+            print(f"  Marked {len(missing)} existing photo records missing from the cache as fetched")
+
     def _fetch_photos(self, place_id: str) -> dict:
         """Fetch photo metadata for a single place."""
         url = f"{API_BASE_URL}/{place_id}"
-        headers = {
-            "X-Goog-Api-Key": self.api_key,
-            "X-Goog-FieldMask": FIELD_MASK,
-        }
 
         max_retries = 3
         for attempt in range(max_retries):
             self.rate_limiter.wait()
             try:
-                response = requests.get(url, headers=headers, timeout=30)
+                response = self.session.get(url, timeout=30)
 
                 if response.status_code == 200:
-                    self.cache["total_api_calls"] = self.cache.get("total_api_calls", 0) + 1
+                    self.rate_limiter.on_success()
+                    with self.lock:
+                        self.cache["total_api_calls"] = self.cache.get("total_api_calls", 0) + 1
                     return response.json()
                 elif response.status_code == 429:
-                    wait_time = (2 ** attempt) * 5
+                    self.rate_limiter.on_failure(RATE_DECREASE_429)
+                    wait_time = retry_after_seconds(response)
+                    if wait_time is None:
+                        wait_time = (2 ** attempt) * 5
                     print(f"    Rate limited. Waiting {wait_time}s...")
                     time.sleep(wait_time)
                 elif response.status_code >= 500:
+                    self.rate_limiter.on_failure(RATE_DECREASE_5XX)
                     wait_time = 2 ** attempt
                     print(f"    Server error {response.status_code}. Retrying in {wait_time}s...")
                     time.sleep(wait_time)
@@ -125,10 +236,14 @@ class PhotoFetcher:
         print(f"    Failed after {max_retries} retries for {place_id}")
         return {}
 
-    def fetch_all(self, limit: int = 0, dry_run: bool = False):
+    def fetch_all(self, limit: int = 0, dry_run: bool = False, verbose: bool = False,
+                  refresh_empty: bool = False):
         """Fetch photos for all normalized businesses not yet in cache."""
         all_ids = list(self.place_ids.keys())
-        remaining = [pid for pid in all_ids if pid not in self.cache["completed_ids"]]
+        if refresh_empty:
+            self._expire_empty()
+        completed = set(self.cache["completed_ids"])
+        remaining = [pid for pid in all_ids if pid not in completed]
 
         if limit > 0:
             remaining = remaining[:limit]
@@ -147,32 +262,61 @@ class PhotoFetcher:
             print(f"  (Photo metadata is a Place Details call — Pro tier)")
             return
 
-        for i, place_id in enumerate(remaining):
-            place_name = self.place_ids.get(place_id, "Unknown")
-            progress = f"[{i+1}/{len(remaining)}]"
-            print(f"  {progress} {place_name} ({place_id[:20]}...)")
+        # map() yields in submission order, so results, cache and log keep
+        # the same order while up to PHOTO_WORKERS requests are in flight
+        pool = ThreadPoolExecutor(max_workers=PHOTO_WORKERS)
+        try:
+            self._collect(remaining, pool.map(self._fetch_photos, remaining), verbose)
+        finally:
+            # On Ctrl-C, drop the queued places instead of fetching them all
+            pool.shutdown(cancel_futures=True)
 
-            result = self._fetch_photos(place_id)
+        self._save()
+
+    def _expire_empty(self):
+        """Drop zero-photo places last checked over EMPTY_TTL_DAYS ago from
+        completed_ids so they are fetched again (records from before check
+        times were kept count as stale)."""
+        checked_at = self.cache.get("empty_checked_at", {})
+        cutoff = time.time() - EMPTY_TTL_DAYS * 86400
+        stale = {
+            pid for pid, record in self.results.items()
+            if pid in self.place_ids and not record.get("photo_count")
+            and checked_at.get(pid, 0) < cutoff
+        }
+        if stale:
+            self.cache["completed_ids"] = [pid for pid in self.cache["completed_ids"] if pid not in stale]
+            print(f"  Refreshing {len(stale)} places with no photos, last checked over {EMPTY_TTL_DAYS} days ago")
+
+    def _collect(self, remaining: list, results, verbose: bool = False):
+        """Record each fetched result, checkpointing by count or elapsed time."""
+        last_save = time.monotonic()
+        new_since = 0
+        for i, (place_id, result) in enumerate(zip(remaining, results)):
+            if verbose or (i + 1) % PROGRESS_EVERY == 0 or i + 1 == len(remaining):
+                place_name = self.place_ids.get(place_id, "Unknown")
+                print(f"  [{i+1}/{len(remaining)}] {place_name} ({place_id[:20]}...)")
 
             if result:
                 photos = result.get("photos", [])
 
                 # Store up to 5 photos with full name + author attributions
-                photo_entries = []
-                for p in photos[:5]:
-                    attributions = []
-                    for attr in p.get("authorAttributions", []):
-                        attributions.append({
-                            "displayName": attr.get("displayName", ""),
-                            "uri": attr.get("uri", ""),
-                            "photoUri": attr.get("photoUri", ""),
-                        })
-                    photo_entries.append({
+                photo_entries = [
+                    {
                         "name": p.get("name", ""),
                         "widthPx": p.get("widthPx", 0),
                         "heightPx": p.get("heightPx", 0),
-                        "authorAttributions": attributions,
-                    })
+                        "authorAttributions": [
+                            {
+                                "displayName": attr.get("displayName", ""),
+                                "uri": attr.get("uri", ""),
+                                "photoUri": attr.get("photoUri", ""),
+                            }
+                            for attr in p.get("authorAttributions", ())
+                        ],
+                    }
+                    for p in photos[:5]
+                ]
 
                 self.results[place_id] = {
                     "photo_count": len(photos),
@@ -186,21 +330,26 @@ class PhotoFetcher:
                 self.results[place_id] = {"photo_count": 0, "photos": []}
                 self.stats["failed"] += 1
 
+            # Remember when a place last came back empty, for --refresh-empty
+            checked_at = self.cache.setdefault("empty_checked_at", {})
+            if self.results[place_id]["photo_count"]:
+                checked_at.pop(place_id, None)
+            else:
+                checked_at[place_id] = int(time.time())
+
             self.cache["completed_ids"].append(place_id)
+            new_since += 1
 
-            # Checkpoint every 100
-            if (i + 1) % 100 == 0:
+            if new_since >= CHECKPOINT_EVERY or time.monotonic() - last_save > CHECKPOINT_SECONDS:
                 self._save()
+                last_save = time.monotonic()
+                new_since = 0
                 print(f"    --- Checkpoint: {len(self.results)} photos fetched ---")
 
-        self._save()
-
     def _save(self):
         DATA_DIR.mkdir(parents=True, exist_ok=True)
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False)
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+        write_json(OUTPUT_FILE, self.results)
+        write_json(CACHE_FILE, self.cache)
 
     def print_summary(self):
         print(f"\n{'='*70}")
@@ -218,6 +367,9 @@ def main():
     parser = argparse.ArgumentParser(description="Fetch Google Places photos for clean listings")
     parser.add_argument("--limit", type=int, default=0, help="Max places to fetch (0 = all)")
     parser.add_argument("--dry-run", action="store_true", help="Print plan without making API calls")
+    parser.add_argument("--verbose", action="store_true", help="Print a progress line for every place")
+    parser.add_argument("--refresh-empty", action="store_true",
+                        help=f"Refetch places with no photos last checked over {EMPTY_TTL_DAYS} days ago")
     args = parser.parse_args()
 
     api_key = os.environ.get("GOOGLE_PLACES_API_KEY")
@@ -225,9 +377,14 @@ def main():
         print("ERROR: Set GOOGLE_PLACES_API_KEY environment variable")
         sys.exit(1)
 
-    fetcher = PhotoFetcher(api_key or "dry-run-key")
-    fetcher.fetch_all(limit=args.limit, dry_run=args.dry_run)
-    fetcher.print_summary()
+    fetcher = PhotoFetcher(api_key or "dry-run-key", load_results=not args.dry_run or args.refresh_empty)
+    try:
+        fetcher.fetch_all(limit=args.limit, dry_run=args.dry_run, verbose=args.verbose,
+                          refresh_empty=args.refresh_empty)
+    finally:
+        fetcher.session.close()
+    if not args.dry_run:
+        fetcher.print_summary()
 
 
 if __name__ == "__main__":
@@ -19,10 +19,18 @@ Usage:
 
 import json
 import re
+import sys
 import unicodedata
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import orjson  # Optional: much faster loads and dumps
+except ImportError:
+    orjson = None
+
 # ─── Configuration ────────────────────────────────────────────────────────────
 DATA_DIR = Path(__file__).parent / "data"
 SITE_DATA_DIR = Path(__file__).parent.parent / "site" / "src" / "data"
@@ -35,14 +43,17 @@ ACTIVE_CATEGORIES = {"Nursing Homes", "Elder Care", "Post-Hospital Care", "Home
 
 # ─── Slug Generation ─────────────────────────────────────────────────────────
 
+SLUG_STRIP_RE = re.compile(r"[^a-z0-9\s-]")
+SLUG_DASH_RE = re.compile(r"[-\s]+")
+
+
+@lru_cache(maxsize=8192)
 def slugify(text: str) -> str:
     """Convert text to URL-friendly slug."""
-    text = unicodedata.normalize("NFKD", text)
-    text = text.encode("ascii", "ignore").decode("ascii")
-    text = text.lower().strip()
-    text = re.sub(r"[^a-z0-9\s-]", "", text)
-    text = re.sub(r"[-\s]+", "-", text)
-    text = text.strip("-")
+    if not text.isascii():  # NFKD + ASCII folding is a no-op on plain ASCII
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = SLUG_STRIP_RE.sub("", text.lower().strip())
+    text = SLUG_DASH_RE.sub("-", text).strip("-")
     return text[:80]  # cap length
 
 
@@ -97,6 +108,8 @@ CATEGORY_META = {
     },
 }
 
+CATEGORY_SLUGS = {cat: meta["slug"] for cat, meta in CATEGORY_META.items()}
+
 
 # ─── City Metadata ────────────────────────────────────────────────────────────
 
@@ -222,6 +235,8 @@ CITY_META = {
     },
 }
 
+CITY_SLUGS = {city: meta["slug"] for city, meta in CITY_META.items()}
+
 
 # ─── Build Functions ──────────────────────────────────────────────────────────
 
@@ -241,6 +256,11 @@ def build_businesses(llm_data: dict, photos_data: dict) -> list:
         if not name or not city:
             continue
 
+        # A handful of distinct values shared by every business; interning
+        # makes the grouping dicts downstream match them by identity
+        category = sys.intern(category)
+        city = sys.intern(city)
+
         # Generate unique slug
         base_slug = slugify(f"{name}-{city}")
         if not base_slug:
@@ -249,11 +269,8 @@ def build_businesses(llm_data: dict, photos_data: dict) -> list:
         slug_set.add(slug)
 
         # Category and city slugs
-        cat_meta = CATEGORY_META.get(category, {})
-        category_slug = cat_meta.get("slug", slugify(category))
-
-        city_meta = CITY_META.get(city, {})
-        city_slug = city_meta.get("slug", slugify(city))
+        category_slug = CATEGORY_SLUGS.get(category) or slugify(category)
+        city_slug = CITY_SLUGS.get(city) or slugify(city)
 
         # Build business object matching the Business interface in types.ts
         business = {
@@ -297,19 +314,36 @@ def build_businesses(llm_data: dict, photos_data: dict) -> list:
         }
 
         # Add photos if available
-        if pid in photos_data and photos_data[pid].get("photos"):
-            business["photos"] = photos_data[pid]["photos"]
+        photos = photos_data.get(pid, {}).get("photos")
+        if photos:
+            business["photos"] = photos
 
         businesses.append(business)
 
     # Sort: rating desc, reviews desc
-    businesses.sort(key=lambda b: (-(b.get("rating") or 0), -(b.get("reviews") or 0)))
+    businesses.sort(key=lambda b: (-(b["rating"] or 0), -(b["reviews"] or 0)))
 
     return businesses
 
 
+def average_rating(bizs: list) -> float:
+    """Mean rating over rated businesses (0 if none), rounded to 2 decimals."""
+    total = 0.0
+    rated = 0
+    for biz in bizs:
+        rating = biz["rating"]
+        if rating:
+            total += rating
+            rated += 1
+    return round(total / max(1, rated), 2)
+
+
 def build_cities(businesses: list) -> dict:
-    """Build cities.json — Record<city_slug, CityData>."""
+    """Build cities.json — Record<city_slug, CityData>.
+
+    Expects businesses in build_businesses' order (rating desc, reviews desc);
+    grouping keeps that order, so each city's top rated are its first five.
+    """
     city_businesses = defaultdict(list)
     for biz in businesses:
         city_businesses[biz["city"]].append(biz)
@@ -325,8 +359,7 @@ def build_cities(businesses: list) -> dict:
         })
 
         cat_counts = Counter(b["category"] for b in bizs)
-        top_rated = sorted(bizs, key=lambda b: (-(b.get("rating") or 0), -(b.get("reviews") or 0)))[:5]
-        rated_bizs = [b for b in bizs if b.get("rating")]
+        top_rated = bizs[:5]
 
         city_slug = meta.get("slug", bizs[0]["city_slug"])
         city_data[city_slug] = {
@@ -334,10 +367,7 @@ def build_cities(businesses: list) -> dict:
             "count": len(bizs),
             "category_counts": dict(cat_counts),
             "top_rated_slugs": [b["slug"] for b in top_rated],
-            "avg_rating": round(
-                sum(b["rating"] for b in rated_bizs) / max(1, len(rated_bizs)),
-                2
-            ),
+            "avg_rating": average_rating(bizs),
         }
 
     return city_data
@@ -358,7 +388,6 @@ def build_categories(businesses: list) -> dict:
         })
 
         city_counts = Counter(b["city"] for b in bizs)
-        rated_bizs = [b for b in bizs if b.get("rating")]
 
         cat_slug = meta.get("slug", bizs[0]["category_slug"])
         cat_data[cat_slug] = {
@@ -366,10 +395,7 @@ def build_categories(businesses: list) -> dict:
             "category_name": cat,
             "count": len(bizs),
             "city_counts": dict(city_counts),
-            "avg_rating": round(
-                sum(b["rating"] for b in rated_bizs) / max(1, len(rated_bizs)),
-                2
-            ),
+            "avg_rating": average_rating(bizs),
         }
 
     return cat_data
@@ -377,23 +403,31 @@ def build_categories(businesses: list) -> dict:
 
 def build_city_categories(businesses: list) -> dict:
     """Build city_category.json — Record<"city_slug/category_slug", CityCategoryData>."""
-    combos = {}
+    # Group slugs first (remembering the first business seen for each combo);
+    # per-combo metadata is then built once per key rather than checked per business
+    groups = {}
     for biz in businesses:
-        key = f"{biz['city_slug']}/{biz['category_slug']}"
-        if key not in combos:
-            combos[key] = {
-                "city": biz["city"],
-                "city_slug": biz["city_slug"],
-                "category": biz["category"],
-                "category_slug": biz["category_slug"],
-                "slug": key,
-                "seo_title": f"Best {biz['category']} in {biz['city']} - Ratings & Services",
-                "seo_description": f"Find top-rated {biz['category'].lower()} in {biz['city']}. Compare facilities, compare services, and get contact information.",
-                "business_slugs": [],
-                "count": 0,
-            }
-        combos[key]["business_slugs"].append(biz["slug"])
-        combos[key]["count"] += 1
+        combo = (biz["city_slug"], biz["category_slug"])
+        group = groups.get(combo)
+        if group is None:
+            group = groups[combo] = (biz, [])
+        group[1].append(biz["slug"])
+
+    combos = {}
+    for (city_slug, category_slug), (first, slugs) in groups.items():
+        city, category = first["city"], first["category"]
+        key = f"{city_slug}/{category_slug}"
+        combos[key] = {
+            "city": city,
+            "city_slug": city_slug,
+            "category": category,
+            "category_slug": category_slug,
+            "slug": key,
+            "seo_title": f"Best {category} in {city} - Ratings & Services",
+            "seo_description": f"Find top-rated {category.lower()} in {city}. Compare facilities, compare services, and get contact information.",
+            "business_slugs": slugs,
+            "count": len(slugs),
+        }
 
     return combos
 
@@ -409,18 +443,38 @@ def build_search_index(businesses: list) -> list:
             "category_slug": biz["category_slug"],
             "city": biz["city"],
             "city_slug": biz["city_slug"],
-            "rating": biz.get("rating"),
-            "reviews": biz.get("reviews", 0),
-            "has_website": bool(biz.get("website")),
-            "phone": biz.get("phone", ""),
-            "specialities": biz.get("specialities", []),
+            "rating": biz["rating"],
+            "reviews": biz["reviews"],
+            "has_website": bool(biz["website"]),
+            "phone": biz["phone"],
+            "specialities": biz["specialities"],
             "services": [],
-            "is_premium": biz.get("is_premium", False),
+            "is_premium": biz["is_premium"],
         }
         index.append(entry)
     return index
 
 
+# ─── Input / Output ───────────────────────────────────────────────────────────
+
+def load_json(filepath: Path):
+    """Read a JSON file, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(filepath.read_bytes())
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+def write_json(filepath: Path, data) -> int:
+    """Write data as indented UTF-8 JSON and return the file size in bytes."""
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    filepath.write_bytes(payload)
+    return len(payload)
+
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -433,8 +487,7 @@ def main():
     # ── Load sources ──────────────────────────────────────────────────────
     print("\n  Loading data...")
 
-    with open(LLM_FILE, "r") as f:
-        llm_data = json.load(f)
+    llm_data = load_json(LLM_FILE)
     print(f"  LLM extractions: {len(llm_data)} entries")
 
     active_count = sum(1 for v in llm_data.values() if v.get("category") in ACTIVE_CATEGORIES)
@@ -442,8 +495,7 @@ def main():
 
     photos_data = {}
     if PHOTOS_FILE.exists():
-        with open(PHOTOS_FILE, "r") as f:
-            photos_data = json.load(f)
+        photos_data = load_json(PHOTOS_FILE)
         with_photos = sum(1 for v in photos_data.values() if v.get("photos"))
         print(f"  Photos: {len(photos_data)} records ({with_photos} with photos)")
     else:
@@ -478,12 +530,12 @@ def main():
         "search_index.json": search_index,
     }
 
-    for filename, data in files.items():
-        filepath = SITE_DATA_DIR / filename
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        size_kb = filepath.stat().st_size / 1024
-        print(f"    {filename:25s} {size_kb:8.1f} KB")
+    # Files are independent, so write them concurrently (serializing holds
+    # the GIL either way; only the file writes overlap)
+    with ThreadPoolExecutor(max_workers=len(files)) as pool:
+        sizes = pool.map(lambda item: write_json(SITE_DATA_DIR / item[0], item[1]), files.items())
+        for filename, size in zip(files, sizes):
+            print(f"    {filename:25s} {size / 1024:8.1f} KB")
 
     # ── Summary stats ─────────────────────────────────────────────────────
     print(f"\n{'='*70}")
@@ -503,12 +555,12 @@ def main():
         print(f"    {city:25s}: {count:5d}")
 
     # Content quality
-    premium = sum(1 for b in businesses if b.get("is_premium"))
-    with_desc = sum(1 for b in businesses if len(b.get("description", "")) > 100)
-    with_specs = sum(1 for b in businesses if b.get("specialities"))
-    with_feats = sum(1 for b in businesses if b.get("facility_features"))
-    with_phone = sum(1 for b in businesses if b.get("phone"))
-    with_web = sum(1 for b in businesses if b.get("website"))
+    premium = sum(1 for b in businesses if b["is_premium"])
+    with_desc = sum(1 for b in businesses if len(b["description"]) > 100)
+    with_specs = sum(1 for b in businesses if b["specialities"])
+    with_feats = sum(1 for b in businesses if b["facility_features"])
+    with_phone = sum(1 for b in businesses if b["phone"])
+    with_web = sum(1 for b in businesses if b["website"])
 
     print(f"\n  Content Quality:")
     print(f"    Premium listings:   {premium:5d}  ({premium/len(businesses)*100:.0f}%)")
@@ -519,7 +571,7 @@ def main():
     print(f"    With website:       {with_web:5d}  ({with_web/len(businesses)*100:.0f}%)")
 
     # Facility types
-    ft_counts = Counter(b.get("facility_type", "Unknown") for b in businesses)
+    ft_counts = Counter(b["facility_type"] for b in businesses)
     print(f"\n  Facility Types:")
     for ft, count in ft_counts.most_common():
         print(f"    {ft:20s}: {count:5d}")
@@ -527,7 +579,7 @@ def main():
     # Top specialities
     spec_counts = Counter()
     for b in businesses:
-        for t in b.get("specialities", []):
+        for t in b["specialities"]:
             spec_counts[t] += 1
     print(f"\n  Top 10 Specialities:")
     for tag, count in spec_counts.most_common(10):